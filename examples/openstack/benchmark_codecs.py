@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""Compare DB codecs on data of the example OpenStack environment.
+
+Run it from main solar directory:
+
+`python examples/openstack/benchmark_codecs.py --setup`
+
+`--setup` creates resources of openstack.py example first (nothing is
+deployed), without it data already stored in the DB is used.
+"""
+
+import time
+
+import click
+import redis
+
+from solar.interfaces.db import codecs
+from solar.interfaces.db import get_db
+
+
+db = get_db()
+
+
+def collect_values():
+    """Decoded values of all string, hash and list keys in the DB."""
+    values = []
+    for key in db._r.scan_iter(count=db.SCAN_COUNT):
+        _type = db._r.type(key)
+        if _type == 'string':
+            raw = [db._r.get(key)]
+        elif _type == 'hash':
+            raw = db._r.hvals(key)
+        elif _type == 'list':
+            raw = db._r.lrange(key, 0, -1)
+        else:
+            continue
+        for value in raw:
+            try:
+                values.append(codecs.decode(value))
+            except ValueError:
+                # counters and other plain values
+                pass
+    return values
+
+
+def measure(codec, values, repeat, scratch):
+    start = time.time()
+    for _ in range(repeat):
+        encoded = [codec.encode(v) for v in values]
+    encode_time = (time.time() - start) / repeat
+
+    start = time.time()
+    for _ in range(repeat):
+        for data in encoded:
+            codecs.decode(data)
+    decode_time = (time.time() - start) / repeat
+
+    scratch.flushdb()
+    used = scratch.info()['used_memory']
+    with scratch.pipeline(transaction=False) as pipe:
+        for i, data in enumerate(encoded):
+            pipe.set(i, data)
+        pipe.execute()
+    memory = scratch.info()['used_memory'] - used
+    scratch.flushdb()
+
+    return encode_time, decode_time, sum(len(d) for d in encoded), memory
+
+
+@click.command()
+@click.option('--setup', is_flag=True, default=False)
+@click.option('--repeat', default=20)
+@click.option('--scratch-db', default=15,
+              help='redis database used to measure memory, will be flushed')
+def main(setup, repeat, scratch_db):
+    if setup:
+        import openstack
+        openstack.setup_resources()
+
+    values = collect_values()
+    scratch = redis.StrictRedis(db=scratch_db, **db.DB)
+
+    click.echo('{} values'.format(len(values)))
+    click.echo('{:10} {:>12} {:>12} {:>12} {:>12}'.format(
+        'codec', 'encode, ms', 'decode, ms', 'size, B', 'memory, B'))
+    for name, codec in (('json', codecs.JSON), ('msgpack', codecs.MSGPACK)):
+        encode_time, decode_time, size, memory = measure(
+            codec, values, repeat, scratch)
+        click.echo('{:10} {:12.2f} {:12.2f} {:12} {:12}'.format(
+            name, encode_time * 1000, decode_time * 1000, size, memory))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,7 @@ class DryRunExecutor(object):
         import mock
 
         from solar.core.handlers import puppet
+        from solar.core import process
 
         self.executed = []
 
@@ -25,6 +26,10 @@ class DryRunExecutor(object):
 
         # Add your own mocks here, IO, whatever
         fabric_api.local = mock.Mock(side_effect=dry_run_executor('LOCAL RUN'))
+        local_run = dry_run_executor('LOCAL RUN')
+        process.run_many = mock.Mock(side_effect=lambda processes: [
+            process.Result(local_run(' '.join(p.args)), '', 0)
+            for p in processes])
         fabric_api.put = mock.Mock(side_effect=dry_run_executor('PUT'))
         fabric_api.run = mock.Mock(side_effect=dry_run_executor('SSH RUN'))
         fabric_api.sudo = mock.Mock(side_effect=dry_run_executor('SSH SUDO'))
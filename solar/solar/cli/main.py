@@ -181,8 +181,9 @@ def init_cli_connect():
                 mapping_parsed.update({k: v})
         signals.connect(emitter, receiver, mapping=mapping_parsed)
 
-        clients = signals.Connections.read_clients()
-        show_emitter_connections(emitter.name, clients[emitter.name])
+        show_emitter_connections(
+            emitter.name,
+            signals.Connections.read_emitter_clients(emitter.name))
 
     @main.command()
     @click.argument('emitter')
@@ -195,8 +196,9 @@ def init_cli_connect():
         click.echo(receiver)
         signals.disconnect(emitter, receiver)
 
-        clients = signals.Connections.read_clients()
-        show_emitter_connections(emitter.name, clients[emitter.name])
+        show_emitter_connections(
+            emitter.name,
+            signals.Connections.read_emitter_clients(emitter.name))
 
 
 def init_cli_connections():
@@ -297,6 +299,7 @@ def init_cli_resource():
     def clear_all():
         click.echo('Clearing all resources')
         db.clear()
+        sresource.invalidate()
 
     @resource.command()
     @click.argument('name')
@@ -402,6 +405,14 @@ def init_cli_resource():
                     ])
                 )
 
+    @resource.command()
+    @click.argument('ip', required=False)
+    def clear_modules_cache(ip):
+        """Forget puppet modules installed on node (or all nodes)."""
+        from solar.core.handlers import puppet
+
+        puppet.invalidate_modules_cache(ip)
+
     @resource.command()
     @click.argument('path', type=click.Path(exists=True, dir_okay=False))
     def get_inputs(path):
@@ -420,7 +431,9 @@ def run():
     main.add_command(orchestration)
     main.add_command(changes)
     main.add_command(events)
-    main()
+
+    with sresource.session():
+        main()
 
 
 if __name__ == '__main__':
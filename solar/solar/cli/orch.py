@@ -1,11 +1,15 @@
 #!/usr/bin/python
 
 import subprocess
+import time
 
 import click
 import networkx as nx
 
 from solar.orchestration import graph
+from solar.orchestration import local as local_executor
+from solar.orchestration import output
+from solar.orchestration import stats as orch_stats
 from solar.orchestration import tasks
 from solar.cli.uids_history import SOLARUID
 
@@ -17,7 +21,10 @@ def orchestration():
     create solar/orchestration/examples/multi.yaml
     <id>
     run-once <id>
+    run <id> --local -j 4
     report <id>
+    stats <id>
+    output <id> <task> --follow
     <task> -> <status>
     restart <id> --reset
     """
@@ -38,7 +45,9 @@ def update(uid, plan):
 
 @orchestration.command()
 @click.argument('uid', type=SOLARUID)
-def report(uid):
+@click.option('--tail', default=0,
+              help='Show last lines of output of running and failed tasks')
+def report(uid, tail):
     colors = {
         'PENDING': 'cyan',
         'ERROR': 'red',
@@ -49,9 +58,60 @@ def report(uid):
     report = graph.report_topo(uid)
     for item in report:
         msg = '{} -> {}'.format(item[0], item[1])
+        timings = ', '.join(
+            '{} {:.1f}s'.format(k, v) for k, v in sorted(item[3].items())
+            if v is not None)
+        if timings:
+            msg += ' ({})'.format(timings)
         if item[2]:
             msg += ' :: {}'.format(item[2])
         click.echo(click.style(msg, fg=colors[item[1]]))
+        if tail and item[1] in ('INPROGRESS', 'ERROR'):
+            task_id = '{}:{}'.format(uid, item[0])
+            for line in output.tail(task_id, tail):
+                click.echo(' '*4+line)
+
+
+@orchestration.command()
+@click.argument('uid', type=SOLARUID)
+def stats(uid):
+    dg = graph.get_graph(uid)
+
+    click.echo('Wall time: {:.1f}s'.format(orch_stats.wall_time(dg)))
+
+    path, total = orch_stats.critical_path(dg)
+    click.echo('Critical path: {:.1f}s'.format(total))
+    for task in path:
+        run = orch_stats.durations(dg.node[task])['run']
+        click.echo('    {} {}'.format(
+            task, '{:.1f}s'.format(run) if run is not None else '-'))
+
+    click.echo('Target utilisation:')
+    for target, (busy, share) in sorted(
+            orch_stats.target_utilisation(dg).items()):
+        click.echo('    {} {:.1f}s {:.0%}'.format(target, busy, share))
+
+    click.echo('Scheduler latency:')
+    for bound, count in orch_stats.histogram(orch_stats.tick_latencies(dg)):
+        click.echo('    <= {}s {}'.format(bound, count))
+
+
+@orchestration.command(name='output')
+@click.argument('uid', type=SOLARUID)
+@click.argument('task')
+@click.option('-f', '--follow', is_flag=True, default=False,
+              help='Wait for new output until the task is finished')
+def task_output(uid, task, follow):
+    task_id = '{}:{}'.format(uid, task)
+    position = 0
+    while True:
+        data, position = output.read(task_id, position)
+        click.echo(data, nl=False)
+
+        status = graph.get_tasks(uid, [task])[task].get('status')
+        if not follow or status != 'INPROGRESS':
+            break
+        time.sleep(1)
 
 @orchestration.command(name='run-once')
 @click.argument('uid', type=SOLARUID)
@@ -63,6 +123,21 @@ def run_once(uid, start, end):
         kwargs={'start': start, 'end': end},
         queue='scheduler')
 
+@orchestration.command()
+@click.argument('uid', type=SOLARUID)
+@click.option('--local', is_flag=True, default=False,
+              help='Execute tasks in this process, without celery workers')
+@click.option('-j', '--jobs', default=4,
+              help='Number of tasks executed at once with --local')
+@click.pass_context
+def run(ctx, uid, local, jobs):
+    if not local:
+        tasks.schedule_start.apply_async(args=[uid], queue='scheduler')
+        return
+    local_executor.run(uid, workers=jobs)
+    ctx.invoke(report, uid=uid)
+
+
 @orchestration.command()
 @click.argument('uid', type=SOLARUID)
 def restart(uid):
@@ -27,8 +27,10 @@ def validate():
 
 @changes.command()
 @click.option('-d', default=False, is_flag=True)
-def stage(d):
-    log = list(change.stage_changes().reverse())
+@click.option('--all', 'full', default=False, is_flag=True,
+              help='Diff all resources, not only changed since last staging')
+def stage(d, full):
+    log = list(change.stage_changes(full=full).reverse())
     for item in log:
         click.echo(item)
         if d:
@@ -49,8 +51,10 @@ def staged_item(log_action):
             click.echo(' '*4+line)
 
 @changes.command()
-def process():
-    uid = change.send_to_orchestration()
+@click.option('--all', 'full', default=False, is_flag=True,
+              help='Diff all resources, not only changed since last staging')
+def process(full):
+    uid = change.send_to_orchestration(full=full)
     remember_uid(uid)
     click.echo(uid)
 
@@ -97,3 +101,5 @@ def test():
 def clean_history():
     data.CL().clean()
     data.CD().clean()
+    # nothing is commited anymore, so everything should be staged again
+    resource.mark_dirty(resource.all_resource_names())
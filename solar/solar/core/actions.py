@@ -1,4 +1,7 @@
 # -*- coding: UTF-8 -*-
+from collections import OrderedDict
+import time
+
 import handlers
 
 
@@ -8,6 +11,64 @@ def resource_action(resource, action):
         return h.action(resource, action)
 
 
+def resource_actions(items):
+    """Run actions of several resources, combined by handler if possible.
+
+    :param items: list of (resource, action)
+    :return: list with exception (or None if action succeeded) per item
+    """
+    return [error for error, _ in timed_resource_actions(items)]
+
+
+def timed_resource_actions(items):
+    """Same as resource_actions, with time spent on every action.
+
+    Handlers which implement action_many(items) get all items for them
+    at once, for others actions are executed one by one. After
+    action_many handler can set `timings` attribute, see
+    handlers.base.split_time, otherwise time of the whole call is split
+    between its items.
+
+    :param items: list of (resource, action)
+    :return: list of (exception or None, (started_at, finished_at, exact))
+             per item, exact is False if action was run together with
+             other actions and its time is only a share of their time
+    """
+    by_handler = OrderedDict()
+    for idx, (resource, action) in enumerate(items):
+        handler = resource.metadata.get('handler', 'none')
+        by_handler.setdefault(handler, []).append((idx, resource, action))
+
+    results = [None] * len(items)
+    timings = [None] * len(items)
+    for handler, group in by_handler.items():
+        with handlers.get(handler)([r for _, r, _ in group]) as h:
+            if hasattr(h, 'action_many'):
+                started_at = time.time()
+                try:
+                    errors = h.action_many([(r, a) for _, r, a in group])
+                except Exception as e:
+                    errors = [e] * len(group)
+                group_timings = getattr(h, 'timings', None)
+                if not group_timings or len(group_timings) != len(group):
+                    group_timings = handlers.base.split_time(
+                        started_at, time.time(), len(group))
+                for (idx, _, _), error, timing in zip(
+                        group, errors, group_timings):
+                    results[idx] = error
+                    timings[idx] = timing
+                continue
+
+            for idx, resource, action in group:
+                started_at = time.time()
+                try:
+                    h.action(resource, action)
+                except Exception as e:
+                    results[idx] = e
+                timings[idx] = (started_at, time.time(), True)
+    return zip(results, timings)
+
+
 def tag_action(tag, action):
     #TODO
     pass
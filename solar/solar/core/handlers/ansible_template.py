@@ -1,30 +1,176 @@
 # -*- coding: utf-8 -*-
-from fabric import api as fabric_api
+from collections import OrderedDict
+import json
+import re
+import time
+
 from fabric.state import env
 import os
+import yaml
 
 from solar.core.log import log
-from solar.core.handlers.base import TempFileHandler
+from solar.core import process
+from solar.core.handlers import base
+from solar.core.handlers.base import LocalProcessHandler
 from solar import errors
 
 
 # otherwise fabric will sys.exit(1) in case of errors
 env.warn_only = True
 
-class AnsibleTemplate(TempFileHandler):
+# upper limit of parallel connections of a bulk ansible-playbook run
+MAX_FORKS = 50
+
+# host line of PLAY RECAP printed by ansible-playbook
+RECAP_RE = re.compile(
+    r'^(?P<host>\S+)\s+:\s+ok=\d+\s+changed=\d+\s+'
+    r'unreachable=(?P<unreachable>\d+)\s+failed=(?P<failed>\d+)')
+
+
+class AnsibleTemplate(LocalProcessHandler):
     def action(self, resource, action_name):
-        inventory_file = self._create_inventory(resource)
-        playbook_file = self._create_playbook(resource, action_name)
+        error = self.action_many([(resource, action_name)])[0]
+        if error is not None:
+            raise error
+
+    def action_many(self, items):
+        """Execute actions with one ansible-playbook run per playbook.
+
+        Resources are grouped by playbook rendered for them, with hosts
+        of plays left out. Each group is run with a single inventory of
+        all hosts of the group, and result of every resource is taken
+        from PLAY RECAP of its host. All groups are run concurrently.
+
+        :param items: list of (resource, action_name)
+        :return: list with exception (or None on success) per item
+        """
+        results = [None] * len(items)
+        self.timings = [None] * len(items)
+        runs = []
+        for group in self._bulk_groups(items):
+            resources = [r for _, r, _, _ in group]
+            try:
+                if len(group) == 1:
+                    _, resource, action_name, _ = group[0]
+                    proc = self._playbook_process(
+                        resource,
+                        self._create_inventory(resource),
+                        self._create_playbook(resource, action_name))
+                else:
+                    proc = self._bulk_process(
+                        [(r, plays) for _, r, _, plays in group])
+            except Exception as e:
+                now = time.time()
+                for idx, _, _, _ in group:
+                    results[idx] = e
+                    self.timings[idx] = (now, now, True)
+                continue
+            runs.append((group, resources, proc))
+
+        outputs = process.run_many([proc for _, _, proc in runs])
+        for (group, resources, _), out in zip(runs, outputs):
+            # resources of a bulk run share its time
+            timings = base.split_time(
+                out.started_at, out.finished_at, len(group))
+            for (idx, _, _, _), error, timing in zip(
+                    group, self._check_results(resources, out), timings):
+                results[idx] = error
+                self.timings[idx] = timing
+        return results
+
+    def _bulk_groups(self, items):
+        """Split items into groups which can be run by one playbook.
+
+        Every host appears in the group at most once, as the inventory
+        holds inputs of a resource in variables of its host.
+        """
+        groups = OrderedDict()
+        for idx, (resource, action_name) in enumerate(items):
+            plays = self._bulk_plays(resource, action_name)
+            if plays is None:
+                key = idx
+            else:
+                key = json.dumps(plays, sort_keys=True)
+
+            ip = resource.args['ip'].value
+            rounds = groups.setdefault(key, [])
+            for group in rounds:
+                if ip not in [r.args['ip'].value for _, r, _, _ in group]:
+                    group.append((idx, resource, action_name, plays))
+                    break
+            else:
+                rounds.append([(idx, resource, action_name, plays)])
+
+        return [group for rounds in groups.values() for group in rounds]
+
+    def _bulk_plays(self, resource, action_name):
+        """Plays of the rendered playbook without hosts.
+
+        None is returned if the playbook can't be run for several
+        resources, i.e. some of its plays is not for the host of the
+        resource.
+        """
+        plays = yaml.safe_load(self._render_action(resource, action_name))
+        ip = resource.args['ip'].value
+        if not isinstance(plays, list):
+            return None
+        for play in plays:
+            if not isinstance(play, dict) or play.get('hosts') not in (ip, [ip]):
+                return None
+        return [dict(play, hosts='all') for play in plays]
+
+    def _bulk_process(self, items):
+        resources = [r for r, _ in items]
+        log.debug('Executing ansible playbook for %s',
+                  [r.name for r in resources])
+
+        directory = self.dirs[resources[0].name]
+        inventory_file = os.path.join(directory, 'inventory-bulk')
+        with open(inventory_file, 'w') as inv:
+            inv.write('\n'.join(self._render_inventory(r) for r in resources))
+
+        playbook_file = os.path.join(directory, 'playbook-bulk.yml')
+        with open(playbook_file, 'w') as f:
+            yaml.safe_dump(items[0][1], f, default_flow_style=False)
+
+        return self._playbook_process(
+            resources[0], inventory_file, playbook_file,
+            forks=min(len(resources), MAX_FORKS))
+
+    def _check_results(self, resources, out):
+        if len(resources) == 1:
+            if out.timed_out or out.failed:
+                return [errors.SolarError(out)]
+            return [None]
+
+        recap = {}
+        for line in out.splitlines():
+            match = RECAP_RE.match(line.strip())
+            if match:
+                recap[match.group('host')] = match
+
+        ret = []
+        for resource in resources:
+            match = recap.get(resource.args['ip'].value)
+            if match is None:
+                ret.append(errors.SolarError(out))
+            elif int(match.group('unreachable')) or int(match.group('failed')):
+                ret.append(errors.SolarError(
+                    'Ansible for {} failed: {}'.format(
+                        resource.name, match.group(0))))
+            else:
+                ret.append(None)
+        return ret
+
+    def _playbook_process(self, resource, inventory_file, playbook_file,
+                          forks=None):
         log.debug('inventory_file: %s', inventory_file)
         log.debug('playbook_file: %s', playbook_file)
         call_args = ['ansible-playbook', '--module-path', '/vagrant/library', '-i', inventory_file, playbook_file]
-        log.debug('EXECUTING: %s', ' '.join(call_args))
-
-        with fabric_api.shell_env(ANSIBLE_HOST_KEY_CHECKING='False'):
-            out = fabric_api.local(' '.join(call_args), capture=True)
-        if out.failed:
-            raise errors.SolarError(out)
-
+        if forks:
+            call_args.extend(['--forks', str(forks)])
+        return self._process(
+            resource, call_args, env={'ANSIBLE_HOST_KEY_CHECKING': 'False'})
 
     def _create_inventory(self, r):
         directory = self.dirs[r.name]
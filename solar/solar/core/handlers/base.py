@@ -3,9 +3,23 @@ import os
 import shutil
 import tempfile
 
-from jinja2 import Template
-
 from solar.core.log import log
+from solar.core import process
+from solar import errors
+from solar import utils
+
+
+def split_time(started_at, finished_at, count):
+    """Timings of `count` actions executed together in given time.
+
+    Time is split into equal consecutive parts, so the total time is
+    the same. See actions.timed_resource_actions.
+    """
+    part = (finished_at - started_at) / float(count)
+    return [
+        (started_at + i * part, started_at + (i + 1) * part, count == 1)
+        for i in range(count)
+    ]
 
 
 class BaseHandler(object):
@@ -54,8 +68,7 @@ class TempFileHandler(BaseHandler):
         log.debug('action file: %s', action_file)
         args = self._make_args(resource)
 
-        with open(action_file) as f:
-            tpl = Template(f.read())
+        tpl = utils.load_template(action_file)
         return tpl.render(str=str, zip=zip, **args)
 
     def _make_args(self, resource):
@@ -65,6 +78,52 @@ class TempFileHandler(BaseHandler):
         return args
 
 
+class LocalProcessHandler(TempFileHandler):
+    """Executes rendered action files with a local interpreter.
+
+    Actions of several resources are run concurrently, `timeout` in
+    resource metadata limits time of the action (in seconds).
+    """
+
+    interpreter = None
+
+    def action(self, resource, action_name):
+        error = self.action_many([(resource, action_name)])[0]
+        if error is not None:
+            raise error
+
+    def action_many(self, items):
+        processes = [
+            self._process(
+                resource,
+                [self.interpreter,
+                 self._compile_action_file(resource, action_name)])
+            for resource, action_name in items
+        ]
+        results = process.run_many(processes)
+        self.timings = [(r.started_at, r.finished_at, True) for r in results]
+        return [
+            self._check_result(resource, result)
+            for (resource, _), result in zip(items, results)
+        ]
+
+    def _process(self, resource, args, **kwargs):
+        return process.Process(
+            args, timeout=resource.metadata.get('timeout'),
+            on_output=process.output_callback(resource.name), **kwargs)
+
+    @staticmethod
+    def _check_result(resource, result):
+        if result.timed_out:
+            return errors.SolarError(
+                'Action of {} timed out'.format(resource.name))
+        if result.failed:
+            return errors.SolarError(
+                'Action of {} failed with {}: {}'.format(
+                    resource.name, result.return_code, result.stderr))
+        return None
+
+
 class Empty(BaseHandler):
     def action(self, resource, action):
         pass
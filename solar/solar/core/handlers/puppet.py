@@ -1,15 +1,66 @@
 # -*- coding: utf-8 -*-
+from collections import OrderedDict
 from contextlib import nested
 from functools import partial
+import pipes
+import re
+import shutil
+import tempfile
+import time
 
 from fabric import api as fabric_api
 from fabric.contrib import project as fabric_project
 import os
 
 from solar.core.log import log
+from solar.core import process
+from solar.core.handlers.base import split_time
 from solar.core.handlers.base import TempFileHandler
+from solar.core.handlers import ssh_pool
 from solar.core.provider import GitProvider
 from solar import errors
+from solar.interfaces.db import get_db
+
+
+db = get_db()
+
+
+# printed after every manifest applied by Puppet.action_many, with
+# index of the manifest, exit code, and start and finish time on the node
+EXIT_MARKER = 'SOLAR-EXIT-CODE'
+EXIT_MARKER_RE = re.compile(
+    r'^{} (\d+) (\d+)(?: ([\d.]+) ([\d.]+))?$'.format(EXIT_MARKER))
+# applies one manifest of the batch, followed by its EXIT_MARKER
+APPLY_COMMAND = (
+    's=$(date +%s.%N); '
+    'FACTER_resource_name={name} puppet apply -vd {manifest} '
+    '--detailed-exitcodes; '
+    'rc=$?; echo "{marker} {idx} $rc $s $(date +%s.%N)"')
+
+
+# Puppet modules installed on nodes are remembered in a hash per node ip,
+# {module: fingerprint}, so installation is skipped when nothing changed.
+# NOTE: fingerprint contains git ref and not commit, use
+# invalidate_modules_cache to pick up new commits of a branch
+
+
+def _modules_cache(resource):
+    return db.get_hash(
+        resource.args['ip'].value, collection=db.COLLECTIONS.puppet_modules)
+
+
+def invalidate_modules_cache(ip=None):
+    """Forget modules installed on node with given ip (or on all nodes)."""
+    if ip is None:
+        db.clear_collection(collection=db.COLLECTIONS.puppet_modules)
+    else:
+        db.delete(ip, collection=db.COLLECTIONS.puppet_modules)
+
+
+def _report_output(resource, output):
+    on_output = process.output_callback(resource.name)
+    if on_output is not None and output:
+        on_output('stdout', output)
 
 
 class ResourceSSHMixin(object):
@@ -22,7 +73,7 @@ class ResourceSSHMixin(object):
             executor = fabric_api.sudo
 
         managers = [
-            fabric_api.settings(**ResourceSSHMixin._fabric_settings(resource)),
+            ResourceSSHMixin._connection(resource),
         ]
 
         if 'cwd' in kwargs:
@@ -60,15 +111,15 @@ class ResourceSSHMixin(object):
                 use_sudo=use_sudo
             )
 
-        with fabric_api.settings(**ResourceSSHMixin._fabric_settings(resource)):
+        with ResourceSSHMixin._connection(resource):
             return executor()
 
     @staticmethod
-    def _fabric_settings(resource):
-        return {
-            'host_string': ResourceSSHMixin._ssh_command_host(resource),
-            'key_filename': resource.args['ssh_key'].value,
-        }
+    def _connection(resource):
+        return ssh_pool.POOL.settings(
+            resource.args['ssh_user'].value,
+            resource.args['ip'].value,
+            resource.args['ssh_key'].value)
 
     @staticmethod
     def _ssh_command_host(resource):
@@ -87,12 +138,6 @@ class LibrarianPuppet(ResourceSSHMixin):
             self.resource.metadata['puppet_module']
         )
 
-        puppetlabs = self._ssh_command(
-            self.resource,
-            'sudo', 'cat', '/var/tmp/puppet/Puppetfile'
-        )
-        log.debug('Puppetlabs file is: \n%s\n', puppetlabs)
-
         git = self.resource.args['git'].value
 
         definition = "mod '{module_name}', :git => '{repository}', :ref => '{branch}'".format(
@@ -101,6 +146,17 @@ class LibrarianPuppet(ResourceSSHMixin):
             branch=git['branch']
         )
 
+        cache = _modules_cache(self.resource)
+        if cache.get(puppet_module) == definition:
+            log.debug('Module %s is already installed', puppet_module)
+            return
+
+        puppetlabs = self._ssh_command(
+            self.resource,
+            'sudo', 'cat', '/var/tmp/puppet/Puppetfile'
+        )
+        log.debug('Puppetlabs file is: \n%s\n', puppetlabs)
+
         modules = puppetlabs.split('\n')
 
         # remove forge entry
@@ -136,6 +192,8 @@ class LibrarianPuppet(ResourceSSHMixin):
             cwd='/var/tmp/puppet'
         )
 
+        cache.set(puppet_module, definition)
+
 
 # NOTE: We assume that:
 # - puppet and hiera are installed
@@ -162,12 +220,132 @@ class Puppet(ResourceSSHMixin, TempFileHandler):
             use_sudo=True,
             warn_only=True,
         )
+        _report_output(resource, cmd)
+        error = self._check_return_code(resource, cmd.return_code)
+        if error is not None:
+            raise error
+        return cmd
+
+    def action_many(self, items):
+        """Execute actions of several resources, one ssh session per node.
+
+        Manifests of all resources on the node are uploaded at once and
+        applied by a single remote script. Every manifest still gets its
+        own `puppet apply`, because manifests look up their inputs in
+        hiera by the global $::resource_name fact.
+
+        :param items: list of (resource, action_name)
+        :return: list with exception (or None on success) per item
+        """
+        by_node = OrderedDict()
+        for idx, (resource, action_name) in enumerate(items):
+            by_node.setdefault(
+                self._ssh_command_host(resource), []).append(
+                    (idx, resource, action_name))
+
+        results = [None] * len(items)
+        self.timings = [None] * len(items)
+        for group in by_node.values():
+            started_at = time.time()
+            try:
+                group_errors, group_timings = self._apply_many(
+                    [(r, a) for _, r, a in group])
+            except Exception as e:
+                group_errors = [e] * len(group)
+                group_timings = split_time(started_at, time.time(), len(group))
+            for (idx, _, _), error, timing in zip(
+                    group, group_errors, group_timings):
+                results[idx] = error
+                self.timings[idx] = timing
+        return results
+
+    def _apply_many(self, items):
+        node = items[0][0]
+        log.debug('Executing Puppet manifests of %s on %s',
+                  [r.name for r, _ in items], self._ssh_command_host(node))
+
+        batch_dir = tempfile.mkdtemp(prefix='solar-batch-', dir=self.dst)
+        remote_dir = '/tmp/{}'.format(os.path.basename(batch_dir))
+        try:
+            script = []
+            for idx, (resource, action_name) in enumerate(items):
+                action_file = self._compile_action_file(resource, action_name)
+                self.upload_manifests(resource)
+
+                manifest = '{}.pp'.format(idx)
+                shutil.copy(action_file, os.path.join(batch_dir, manifest))
+                script.append(APPLY_COMMAND.format(
+                    name=pipes.quote(resource.name),
+                    manifest='{}/{}'.format(remote_dir, manifest),
+                    marker=EXIT_MARKER,
+                    idx=idx))
+            script.append('rm -rf {}'.format(pipes.quote(remote_dir)))
+
+            self._scp_command(node, batch_dir, '/tmp')
+
+            started_at = time.time()
+            cmd = self._ssh_command(
+                node,
+                'bash', '-c', pipes.quote('\n'.join(script)),
+                use_sudo=True,
+                warn_only=True,
+            )
+            finished_at = time.time()
+        finally:
+            shutil.rmtree(batch_dir, ignore_errors=True)
+
+        return_codes = {}
+        remote_timings = {}
+        lines = []
+        for line in cmd.splitlines():
+            match = EXIT_MARKER_RE.match(line.strip())
+            if not match:
+                lines.append(line)
+                continue
+            idx = int(match.group(1))
+            return_codes[idx] = int(match.group(2))
+            if match.group(3):
+                remote_timings[idx] = (
+                    float(match.group(3)), float(match.group(4)))
+            # output printed before the marker belongs to its manifest
+            _report_output(items[idx][0], '\n'.join(lines))
+            lines = []
+
+        return [
+            self._check_return_code(resource, return_codes.get(idx))
+            for idx, (resource, _) in enumerate(items)
+        ], self._timings(len(items), remote_timings, started_at, finished_at)
+
+    @staticmethod
+    def _timings(count, remote_timings, started_at, finished_at):
+        """Local timings of manifests from times measured on the node.
+
+        Node clock is aligned by the start of the first manifest, time of
+        manifests without marker is split from the end of the last one.
+        """
+        timings = [None] * count
+        offset = 0
+        if remote_timings:
+            offset = started_at - min(s for s, _ in remote_timings.values())
+        for idx, (s, e) in remote_timings.items():
+            timings[idx] = (s + offset, e + offset, True)
+
+        missing = [idx for idx in range(count) if timings[idx] is None]
+        if missing:
+            tail = max([t[1] for t in timings if t] + [started_at])
+            for idx, timing in zip(missing, split_time(
+                    tail, max(tail, finished_at), len(missing))):
+                timings[idx] = timing
+        return timings
+
+    @staticmethod
+    def _check_return_code(resource, return_code):
         # 0 - no changes, 2 - successfull changes
-        if cmd.return_code not in [0, 2]:
-            raise errors.SolarError(
+        if return_code not in [0, 2]:
+            return errors.SolarError(
                 'Puppet for {} failed with {}'.format(
-                    resource.name, cmd.return_code))
-        return cmd
+                    resource.name, return_code))
+        return None
 
     def clone_manifests(self, resource):
         git = resource.args['git'].value
@@ -184,6 +362,11 @@ class Puppet(ResourceSSHMixin, TempFileHandler):
     def upload_manifests_forge(self, resource):
         forge = resource.args['forge'].value
 
+        cache = _modules_cache(resource)
+        if cache.get(forge):
+            log.debug('Module %s is already installed', forge)
+            return
+
         # Check if module already installed
         modules = self._ssh_command(
             resource,
@@ -204,6 +387,8 @@ class Puppet(ResourceSSHMixin, TempFileHandler):
         else:
             log.debug('Skipping module installation, already installed')
 
+        cache.set(forge, True)
+
     def upload_manifests_librarian(self, resource):
         librarian = LibrarianPuppet(resource)
         librarian.install()
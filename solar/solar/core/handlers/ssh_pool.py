@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import atexit
+from contextlib import contextmanager
+import threading
+import time
+
+from fabric import api as fabric_api
+from fabric import network
+from fabric import state
+
+from solar.core.log import log
+
+
+# connections not used for that long are closed
+IDLE_TIMEOUT = 300
+# interval of keepalive packets, so idle connections are not dropped
+KEEPALIVE = 30
+
+
+class SSHPool(object):
+    """Keep-alive SSH connections shared by handlers.
+
+    Connections are keyed by (user, host, port, key), fabric commands
+    run in `settings` of the pool reuse the connection, every command
+    is executed in a separate channel of the same transport.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, keepalive=KEEPALIVE):
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        # key -> (client, last used)
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def get(self, user, host, key_filename, port=22):
+        self.evict_idle()
+
+        key = (user, host, port, key_filename)
+        with self.lock:
+            client, _ = self.clients.pop(key, (None, None))
+
+        if client is not None and not _is_active(client):
+            log.debug('SSH connection to %s@%s is closed', user, host)
+            client.close()
+            client = None
+
+        if client is None:
+            client = self._connect(user, host, port, key_filename)
+
+        with self.lock:
+            self.clients[key] = (client, time.time())
+        return client
+
+    def _connect(self, user, host, port, key_filename):
+        log.debug('SSH connecting to %s@%s:%s', user, host, port)
+        with fabric_api.settings(key_filename=key_filename):
+            client = network.connect(
+                user, host, port, cache=state.connections,
+                seek_gateway=bool(state.env.gateway))
+        client.get_transport().set_keepalive(self.keepalive)
+        return client
+
+    def evict_idle(self):
+        deadline = time.time() - self.idle_timeout
+        with self.lock:
+            idle = [k for k, (_, used) in self.clients.items()
+                    if used < deadline]
+            clients = [self.clients.pop(k)[0] for k in idle]
+
+        for client in clients:
+            client.close()
+
+    def close_all(self):
+        with self.lock:
+            clients = [client for client, _ in self.clients.values()]
+            self.clients.clear()
+
+        for client in clients:
+            client.close()
+
+    @contextmanager
+    def settings(self, user, host, key_filename, port=22):
+        """fabric settings to run commands with pooled connection."""
+        client = self.get(user, host, key_filename, port=port)
+        host_string = network.join_host_strings(user, host, port)
+        # fabric looks up connections by host string only, pooled
+        # client for this key is installed right before use
+        state.connections[host_string] = client
+
+        with fabric_api.settings(
+                host_string=host_string, key_filename=key_filename):
+            yield
+
+
+def _is_active(client):
+    transport = client.get_transport()
+    return transport is not None and transport.is_active()
+
+
+POOL = SSHPool()
+atexit.register(POOL.close_all)
@@ -132,16 +132,12 @@ class Observer(BaseObserver):
         log.debug('Notify from %s value %s', emitter, emitter.value)
         # Copy emitter's values to receiver
         self.value = emitter.value
-        for receiver in self.receivers:
-            receiver.notify(self)
-        self.attached_to.set_args_from_dict({self.name: self.value})
+        signals.propagate(self.attached_to, {self.name: self.value})
 
     def update(self, value):
         log.debug('Updating to value %s', value)
         self.value = value
-        for receiver in self.receivers:
-            receiver.notify(self)
-        self.attached_to.set_args_from_dict({self.name: self.value})
+        signals.propagate(self.attached_to, {self.name: self.value})
 
     def subscribed(self, emitter):
         super(Observer, self).subscribed(emitter)
@@ -169,9 +165,7 @@ class ListObserver(BaseObserver):
         # Copy emitter's values to receiver
         idx = self._emitter_idx(emitter)
         self.value[idx] = self._format_value(emitter)
-        for receiver in self.receivers:
-            receiver.notify(self)
-        self.attached_to.set_args_from_dict({self.name: self.value})
+        signals.propagate(self.attached_to, {self.name: self.value})
 
     def subscribed(self, emitter):
         super(ListObserver, self).subscribed(emitter)
@@ -188,9 +182,7 @@ class ListObserver(BaseObserver):
         log.debug('Unsubscribed emitter %s', emitter)
         idx = self._emitter_idx(emitter)
         self.value.pop(idx)
-        self.attached_to.set_args_from_dict({self.name: self.value})
-        for receiver in self.receivers:
-            receiver.notify(self)
+        signals.propagate(self.attached_to, {self.name: self.value})
 
     def _emitter_idx(self, emitter):
         try:
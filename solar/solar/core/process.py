@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""Local subprocesses driven without blocking on any single one of them.
+
+Output of all processes is read in chunks from a single select loop, so
+one thread can execute many actions at once, pass their output further
+while they are running, and kill those running longer than allowed.
+"""
+
+from contextlib import contextmanager
+import errno
+import os
+import select
+import signal
+import subprocess
+import threading
+import time
+
+from solar.core.log import log
+
+
+# max size of a chunk read from a pipe at once
+CHUNK_SIZE = 4096
+# max time select waits when none of processes has a timeout
+POLL_INTERVAL = 1.0
+
+
+# output callbacks of the current thread, by resource name
+_outputs = threading.local()
+
+
+@contextmanager
+def output_to(on_output, resource_name=None):
+    """Send output of actions executed in this thread to on_output.
+
+    Callback registered without resource name receives output of all
+    resources that don't have their own callback.
+    """
+    previous = getattr(_outputs, 'callbacks', {})
+    _outputs.callbacks = dict(previous)
+    _outputs.callbacks[resource_name] = on_output
+    try:
+        yield
+    finally:
+        _outputs.callbacks = previous
+
+
+def output_callback(resource_name=None):
+    """Callback registered by output_to for resource, or None."""
+    callbacks = getattr(_outputs, 'callbacks', {})
+    return callbacks.get(resource_name, callbacks.get(None))
+
+
+class Result(str):
+    """stdout of finished process, with the rest of results as attributes.
+
+    Mimics result of fabric's local(capture=True).
+    """
+
+    def __new__(cls, stdout, stderr, return_code, timed_out=False,
+                started_at=None, finished_at=None):
+        obj = super(Result, cls).__new__(cls, stdout)
+        obj.stdout = stdout
+        obj.stderr = stderr
+        obj.return_code = return_code
+        obj.timed_out = timed_out
+        obj.started_at = started_at
+        obj.finished_at = finished_at
+        return obj
+
+    @property
+    def failed(self):
+        return self.return_code != 0
+
+    @property
+    def succeeded(self):
+        return not self.failed
+
+
+class Process(object):
+    """Command to execute, see run_many.
+
+    :param args: list of program arguments
+    :param env: variables added to environment of the current process
+    :param timeout: seconds after which the process is killed
+    :param on_output: callable(stream, chunk), stream is 'stdout' or
+                      'stderr', called for every chunk read
+    """
+
+    def __init__(self, args, env=None, cwd=None, timeout=None,
+                 on_output=None):
+        self.args = args
+        self.env = env
+        self.cwd = cwd
+        self.timeout = timeout
+        self.on_output = on_output
+        self.popen = None
+        self.deadline = None
+        self.timed_out = False
+        self.started_at = None
+        self.finished_at = None
+        self.streams = {}
+        self.output = {'stdout': [], 'stderr': []}
+
+    def start(self):
+        log.debug('EXECUTING: %s', ' '.join(self.args))
+        env = None
+        if self.env:
+            env = dict(os.environ, **self.env)
+        # own process group, so children of the process are killed too
+        self.popen = subprocess.Popen(
+            self.args, stdin=open(os.devnull), stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, env=env, cwd=self.cwd,
+            close_fds=True, preexec_fn=os.setsid)
+        self.streams = {
+            self.popen.stdout.fileno(): 'stdout',
+            self.popen.stderr.fileno(): 'stderr',
+        }
+        self.started_at = time.time()
+        if self.timeout:
+            self.deadline = self.started_at + self.timeout
+
+    def read(self, fd):
+        chunk = os.read(fd, CHUNK_SIZE)
+        stream = self.streams[fd]
+        if not chunk:
+            del self.streams[fd]
+            if not self.streams:
+                # output is closed, process is done or about to exit
+                self.deadline = None
+                self.finished_at = time.time()
+            return
+        self.output[stream].append(chunk)
+        if self.on_output is not None:
+            self.on_output(stream, chunk)
+
+    def running(self):
+        return (
+            self.popen is not None and bool(self.streams) and
+            self.popen.poll() is None)
+
+    def kill(self):
+        log.debug('Killing %s', self.args)
+        self.deadline = None
+        try:
+            os.killpg(self.popen.pid, signal.SIGKILL)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+
+    def result(self):
+        self.popen.stdout.close()
+        self.popen.stderr.close()
+        return_code = self.popen.wait()
+        if self.finished_at is None:
+            self.finished_at = time.time()
+        return Result(
+            ''.join(self.output['stdout']), ''.join(self.output['stderr']),
+            return_code, timed_out=self.timed_out,
+            started_at=self.started_at, finished_at=self.finished_at)
+
+
+def run_many(processes):
+    """Start all processes and wait for them, returns list of Result."""
+    started = []
+    try:
+        for p in processes:
+            p.start()
+            started.append(p)
+    except Exception:
+        for p in started:
+            p.kill()
+            p.result()
+        raise
+
+    by_fd = {}
+    for p in processes:
+        for fd in p.streams:
+            by_fd[fd] = p
+
+    while by_fd:
+        now = time.time()
+        deadlines = [p.deadline for p in processes if p.deadline]
+        wait = POLL_INTERVAL
+        if deadlines:
+            wait = max(min(min(deadlines) - now, wait), 0)
+
+        try:
+            readable, _, _ = select.select(list(by_fd), [], [], wait)
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+
+        for fd in readable:
+            p = by_fd[fd]
+            p.read(fd)
+            if fd not in p.streams:
+                del by_fd[fd]
+
+        now = time.time()
+        for p in processes:
+            if p.deadline and p.deadline <= now:
+                if p.running():
+                    log.debug('%s timed out after %s seconds',
+                              p.args, p.timeout)
+                    p.timed_out = True
+                    p.kill()
+                else:
+                    p.deadline = None
+
+    return [p.result() for p in processes]
+
+
+def run(args, **kwargs):
+    """Execute a single command, see Process for arguments."""
+    return run_many([Process(args, **kwargs)])[0]
@@ -1,21 +1,39 @@
 __all__ = [
     'Resource',
+    'all_resource_names',
     'assign_resources_to_nodes',
     'connect_resources',
     'create',
+    'create_many',
+    'dirty_resources',
+    'invalidate',
     'load',
     'load_all',
+    'load_many',
+    'mark_dirty',
     'prepare_meta',
+    'save_all',
+    'session',
+    'unmark_dirty',
     'wrap_resource',
     'validate_resources',
 ]
 
 
 from solar.core.resource.resource import Resource
+from solar.core.resource.resource import all_resource_names
 from solar.core.resource.resource import assign_resources_to_nodes
 from solar.core.resource.resource import connect_resources
+from solar.core.resource.resource import create_many
+from solar.core.resource.resource import dirty_resources
+from solar.core.resource.resource import invalidate
 from solar.core.resource.resource import load
 from solar.core.resource.resource import load_all
+from solar.core.resource.resource import load_many
+from solar.core.resource.resource import mark_dirty
+from solar.core.resource.resource import save_all
+from solar.core.resource.resource import session
+from solar.core.resource.resource import unmark_dirty
 from solar.core.resource.resource import wrap_resource
 from solar.core.resource.virtual_resource import create
 from solar.core.resource.virtual_resource import prepare_meta
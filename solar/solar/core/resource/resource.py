@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
+from contextlib import contextmanager
+import hashlib
+import json
 import os
+import threading
+import uuid
 
 from copy import deepcopy
 
@@ -11,15 +16,119 @@ from solar.core import signals
 from solar.core import validation
 
 from solar.core.connections import ResourcesConnectionGraph
+from solar import errors
 from solar.interfaces.db import get_db
 
 db = get_db()
 
 
+class _IdentityMap(threading.local):
+    """Resources loaded in current session, by name.
+
+    `resources` is None when no session is active, otherwise it holds
+    (Resource, version) by name, see RESOURCE_VERSIONS. `saved_meta`
+    holds digests of metadata records written in the session.
+    """
+    resources = None
+    saved_meta = None
+
+
+_identity_map = _IdentityMap()
+
+
+@contextmanager
+def session():
+    """Share loaded resources for the duration of the block.
+
+    Inside of a session load() returns the same Resource object for a
+    given name and its args are served from memory instead of being read
+    from the DB on every access. Writes made through Resource objects go
+    to the DB immediately and keep the cached object up to date.
+
+    Every load checks version of the resource, so resource written
+    elsewhere (by other process too) is read again. Objects already
+    returned keep their state, so a session should still be scoped to a
+    single CLI command or task.
+    """
+    if _identity_map.resources is not None:
+        # nested sessions share the outer one
+        yield
+        return
+
+    _identity_map.resources = {}
+    _identity_map.saved_meta = set()
+    try:
+        yield
+    finally:
+        _identity_map.resources = None
+        _identity_map.saved_meta = None
+
+
+def invalidate(resource_name=None):
+    """Drop resource (or all resources) from the current session.
+
+    Without resource name metadata is forgotten too, so it is written
+    again after the DB was cleared.
+    """
+    if resource_name is None:
+        _meta_cache.clear()
+
+    if _identity_map.resources is None:
+        return
+
+    if resource_name is None:
+        _identity_map.resources.clear()
+        _identity_map.saved_meta.clear()
+    else:
+        _identity_map.resources.pop(resource_name, None)
+
+
+def _remember(resource, version=None):
+    if _identity_map.resources is not None:
+        _identity_map.resources[resource.name] = (resource, version)
+
+
+def _is_remembered(resource):
+    return (
+        _identity_map.resources is not None and
+        _identity_map.resources.get(resource.name, (None,))[0] is resource
+    )
+
+
+def _cached(resource_names):
+    """Resources of the session which were not written since loaded."""
+    if _identity_map.resources is None:
+        return {}
+
+    names = [n for n in resource_names if n in _identity_map.resources]
+    if not names:
+        return {}
+
+    ret = {}
+    for name, version in zip(names, _versions().get_many(names)):
+        resource, loaded_version = _identity_map.resources[name]
+        if version == loaded_version:
+            ret[name] = resource
+        else:
+            del _identity_map.resources[name]
+    return ret
+
+
+def _read_versions(resource_names):
+    """Versions of resources, read before resources themselves."""
+    if _identity_map.resources is None or not resource_names:
+        return [None] * len(resource_names)
+    return _versions().get_many(resource_names)
+
+
 class Resource(object):
     _metadata = {}
 
     def __init__(self, name, metadata, args, tags=None, virtual_resource=None):
+        self._init(name, metadata, tags, virtual_resource)
+        self.set_args_from_dict(args)
+
+    def _init(self, name, metadata, tags, virtual_resource):
         self.name = name
         if metadata:
             self.metadata = metadata
@@ -30,7 +139,6 @@ class Resource(object):
 
         self.tags = tags or []
         self.virtual_resource = virtual_resource
-        self.set_args_from_dict(args)
 
     @property
     def actions(self):
@@ -52,7 +160,11 @@ class Resource(object):
         return ret
 
     def args_dict(self):
-        raw_resource = db.read(self.name, collection=db.COLLECTIONS.resource)
+        if _is_remembered(self):
+            # metadata of the session's resource is kept in sync on writes
+            return Resource.get_raw_resource_args(self.metadata)
+
+        raw_resource = read_raw(self.name)
         if raw_resource is None:
             return {}
 
@@ -64,6 +176,11 @@ class Resource(object):
         args = self.args_dict()
         args.update(new_args)
 
+        self.apply_args(args)
+        save_all([self])
+
+    def apply_args(self, args):
+        """Set args in metadata, without saving the resource."""
         self.metadata['tags'] = self.tags
         self.metadata['virtual_resource'] = self.virtual_resource
         for k, v in args.items():
@@ -76,8 +193,6 @@ class Resource(object):
                 v = v['value']
             self.metadata['input'][k]['value'] = v
 
-        db.save(self.name, self.metadata, collection=db.COLLECTIONS.resource)
-
     def set_args(self, args):
         self.set_args_from_dict({k: v.value for k, v in args.items()})
 
@@ -113,8 +228,9 @@ class Resource(object):
             if isinstance(v, observer.ListObserver):
                 return v.value
             elif isinstance(v, observer.Observer):
+                emitter = signals.Connections.emitter(self.name, v.name)
                 return {
-                    'emitter': v.emitter.attached_to.name if v.emitter else None,
+                    'emitter': emitter[0] if emitter else None,
                     'value': v.value,
                 }
 
@@ -152,12 +268,7 @@ class Resource(object):
         # Update will be blocked if this resource is listening
         # on some input that is to be updated -- we should only listen
         # to the emitter and not be able to change the input's value
-        r_args = self.args
-
-        for key, value in args.iteritems():
-            r_args[key].update(value)
-
-        self.set_args(r_args)
+        signals.propagate(self, args)
 
     def action(self, action):
         if action in self.actions:
@@ -170,13 +281,18 @@ class Resource(object):
         return {k: v.get('value') for k, v in raw_resource['input'].items()}
 
 
-def wrap_resource(raw_resource):
+def wrap_resource(raw_resource, version=None):
+    raw_resource = _merge_list([raw_resource])[0]
     name = raw_resource['id']
-    args = Resource.get_raw_resource_args(raw_resource)
     tags = raw_resource.get('tags', [])
     virtual_resource = raw_resource.get('virtual_resource', [])
 
-    return Resource(name, raw_resource, args, tags=tags, virtual_resource=virtual_resource)
+    # raw resource already holds the stored state, no need to save it back
+    resource = Resource.__new__(Resource)
+    resource._init(name, raw_resource, tags, virtual_resource)
+    _remember(resource, version)
+
+    return resource
 
 
 def wrap_resource_no_value(raw_resource):
@@ -188,23 +304,245 @@ def wrap_resource_no_value(raw_resource):
     return Resource(name, raw_resource, args, tags=tags, virtual_resource=virtual_resource)
 
 
+def create_many(items):
+    """Create resources with one read and one pipelined write.
+
+    Same as calling Resource(name, metadata, args, tags, virtual_resource)
+    for every item: if resource already exists, its stored metadata is
+    used and updated with args.
+
+    :param items: list of (name, metadata, args, tags, virtual_resource)
+    :return: list of Resource
+    """
+    stored = read_raw_list([item[0] for item in items])
+
+    resources = []
+    for (name, metadata, args, tags, virtual_resource), raw in zip(
+            items, stored):
+        resource = Resource.__new__(Resource)
+        resource._init(name, metadata, tags, virtual_resource)
+
+        resource_args = {}
+        if raw is not None:
+            resource.metadata = raw
+            resource_args = Resource.get_raw_resource_args(raw)
+        resource_args.update(args)
+        resource.apply_args(resource_args)
+
+        resources.append(resource)
+
+    save_all(resources)
+    return resources
+
+
 def load(resource_name):
-    raw_resource = db.read(resource_name, collection=db.COLLECTIONS.resource)
+    cached = _cached([resource_name])
+    if resource_name in cached:
+        return cached[resource_name]
+
+    version = _read_versions([resource_name])[0]
+    raw_resource = read_raw(resource_name)
 
     if raw_resource is None:
         raise KeyError(
             'Resource {} does not exist'.format(resource_name)
         )
 
-    return wrap_resource(raw_resource)
+    return wrap_resource(raw_resource, version)
+
+
+def load_many(resource_names):
+    """Load resources with a single DB round trip.
+
+    :return: {resource_name: Resource}, resources which don't exist
+             are skipped
+    """
+    ret = _cached(resource_names)
+    to_read = [name for name in resource_names if name not in ret]
+
+    versions = _read_versions(to_read)
+    for raw_resource, version in zip(read_raw_list(to_read), versions):
+        if raw_resource is not None:
+            ret[raw_resource['id']] = wrap_resource(raw_resource, version)
+
+    return ret
+
+
+def save_all(resources):
+    """Save resources with a single pipelined DB write."""
+    version = save_raw_list([r.metadata for r in resources])
+    mark_dirty([r.name for r in resources])
+
+    # these objects hold the latest state now, any other object with
+    # the same name in the session is stale
+    for r in resources:
+        _remember(r, version)
+
+
+# Resource is stored in two records:
+#
+#   resource_meta:<digest> - static part of metadata (actions, paths,
+#                            input schemas, ...), shared by all resources
+#                            with the same metadata
+#   resource:<name>        - values of inputs, tags and digest of metadata
+#
+# resource:<name> keeps {'input': {<name>: {'value': ...}}} layout of
+# the full metadata, so it is readable by hiera-redis backend.
+
+RESOURCE_FIELDS = ('id', 'tags', 'virtual_resource')
+
+# metadata records never change, so they can be cached by digest
+_meta_cache = {}
+
+
+def _split(metadata):
+    """Split full metadata into (digest, static metadata, resource record)"""
+    meta = {k: v for k, v in metadata.items() if k not in RESOURCE_FIELDS}
+    meta['input'] = {
+        k: {f: v for f, v in schema.items() if f != 'value'}
+        for k, schema in metadata['input'].items()
+    }
+    digest = hashlib.sha1(json.dumps(meta, sort_keys=True)).hexdigest()
+
+    record = {k: metadata.get(k) for k in RESOURCE_FIELDS}
+    record['meta'] = digest
+    record['input'] = {
+        k: {'value': schema.get('value')}
+        for k, schema in metadata['input'].items()
+    }
+    return digest, meta, record
+
+
+def _merge_list(records):
+    """Full metadata for resource records, with one read of missing meta."""
+    records = list(records)
+    missing = list({
+        r['meta'] for r in records
+        if r is not None and 'meta' in r and r['meta'] not in _meta_cache})
+    for digest, meta in zip(missing, db.read_list(
+            missing, collection=db.COLLECTIONS.resource_meta)):
+        if meta is not None:
+            _meta_cache[digest] = meta
+
+    ret = []
+    for record in records:
+        # records saved before metadata was split are full already
+        if record is None or 'meta' not in record:
+            ret.append(record)
+            continue
+        if record['meta'] not in _meta_cache:
+            raise errors.SolarError(
+                'Metadata {} of resource {} does not exist'.format(
+                    record['meta'], record.get('id')))
+        metadata = deepcopy(_meta_cache[record['meta']])
+        for k in RESOURCE_FIELDS:
+            metadata[k] = record.get(k)
+        for k, value in record['input'].items():
+            metadata['input'].setdefault(k, {})['value'] = value['value']
+        ret.append(metadata)
+    return ret
+
+
+def read_raw(resource_name):
+    return read_raw_list([resource_name])[0]
+
+
+def read_raw_list(resource_names):
+    """Full metadata of resources, None for missing ones."""
+    return _merge_list(
+        db.read_list(resource_names, collection=db.COLLECTIONS.resource))
+
+
+def save_raw_list(metadatas):
+    """Save resources with a single pipelined write.
+
+    Shared metadata is written only if it wasn't written in the current
+    session yet (outside of a session - every time, as it is idempotent).
+    Saved resources are dropped from the session, as its objects don't
+    hold the written state.
+
+    :return: new version of saved resources, see RESOURCE_VERSIONS
+    """
+    version = uuid.uuid4().hex
+    records = []
+    metas = {}
+    for metadata in metadatas:
+        digest, meta, record = _split(metadata)
+        records.append((record['id'], record))
+        if (_identity_map.saved_meta is None or
+                digest not in _identity_map.saved_meta):
+            metas[digest] = meta
+
+    with db.pipeline() as pipe:
+        db.save_list(
+            metas.items(), collection=db.COLLECTIONS.resource_meta, pipe=pipe)
+        db.save_list(records, collection=db.COLLECTIONS.resource, pipe=pipe)
+        _versions().set_many(
+            [(name, version) for name, _ in records], pipe=pipe)
+        pipe.execute()
+
+    _meta_cache.update(metas)
+    for name, _ in records:
+        invalidate(name)
+    if _identity_map.saved_meta is not None:
+        _identity_map.saved_meta.update(metas)
+    return version
+
+
+# hash with version of every resource, changed on every write, so
+# sessions notice resources written elsewhere
+RESOURCE_VERSIONS = 'resource_versions'
+
+
+def _versions():
+    return db.get_hash(
+        RESOURCE_VERSIONS, collection=db.COLLECTIONS.state_data)
+
+
+DIRTY_RESOURCES = 'dirty_resources'
+
+
+def mark_dirty(resource_names):
+    """Remember resources which could differ from commited state.
+
+    Staging diffs only these resources instead of the whole environment.
+    """
+    db.add_to_set(
+        DIRTY_RESOURCES, list(resource_names),
+        collection=db.COLLECTIONS.state_data)
+
+
+def unmark_dirty(resource_names):
+    db.remove_from_set(
+        DIRTY_RESOURCES, list(resource_names),
+        collection=db.COLLECTIONS.state_data)
+
+
+def dirty_resources():
+    return db.read_set(DIRTY_RESOURCES, collection=db.COLLECTIONS.state_data)
+
+
+def all_resource_names():
+    return db.get_uids(collection=db.COLLECTIONS.resource)
 
 
 def load_all():
     ret = {}
 
-    for raw_resource in db.get_list(collection=db.COLLECTIONS.resource):
-        resource = wrap_resource(raw_resource)
-        ret[resource.name] = resource
+    versions = {}
+    if _identity_map.resources is not None:
+        versions = dict(_versions().items())
+
+    for raw_resource in _merge_list(
+            db.get_list(collection=db.COLLECTIONS.resource)):
+        name = raw_resource['id']
+        version = versions.get(name)
+        # resources from current session which were not written since
+        resource, loaded_version = (
+            _identity_map.resources or {}).get(name, (None, None))
+        if resource is None or loaded_version != version:
+            resource = wrap_resource(raw_resource, version)
+        ret[name] = resource
 
     return ret
 
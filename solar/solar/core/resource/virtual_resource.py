@@ -1,4 +1,5 @@
 # -*- coding: UTF-8 -*-
+from copy import deepcopy
 import os
 from StringIO import StringIO
 
@@ -8,29 +9,47 @@ from jinja2 import Template, Environment, meta
 
 from solar import utils
 from solar.core import validation
-from solar.core.resource import load_all, Resource
+from solar.core.resource import create_many, load_all, load_many, Resource
 from solar.core import provider
 from solar.core import signals
 
 
-def create_resource(name, base_path, args, virtual_resource=None):
-    if isinstance(base_path, provider.BaseProvider):
-        base_path = base_path.directory
-
+def _base_meta(base_path):
     base_meta_file = os.path.join(base_path, 'meta.yaml')
-    actions_path = os.path.join(base_path, 'actions')
 
     metadata = utils.yaml_load(base_meta_file)
-    metadata['id'] = name
     metadata['version'] = '1.0.0'
     metadata['base_path'] = os.path.abspath(base_path)
 
     prepare_meta(metadata)
+    return metadata
+
+
+def create_resource(name, base_path, args, virtual_resource=None):
+    return create_bulk(base_path, [(name, args)], virtual_resource)[0]
+
+
+def create_bulk(base_path, items, virtual_resource=None):
+    """Create resources of the same type from base_path.
+
+    meta.yaml is parsed once and all resources are saved with one write.
+
+    :param items: list of (name, args)
+    :return: list of Resource
+    """
+    if isinstance(base_path, provider.BaseProvider):
+        base_path = base_path.directory
+
+    base_meta = _base_meta(base_path)
 
-    tags = metadata.get('tags', [])
+    to_create = []
+    for name, args in items:
+        metadata = deepcopy(base_meta)
+        metadata['id'] = name
+        tags = metadata.get('tags', [])
+        to_create.append((name, metadata, args, tags, virtual_resource))
 
-    resource = Resource(name, metadata, args, tags, virtual_resource)
-    return resource
+    return create_many(to_create)
 
 
 def create_virtual_resource(vr_name, template):
@@ -39,24 +58,41 @@ def create_virtual_resource(vr_name, template):
     created_resources = []
 
     cwd = os.getcwd()
+    # consecutive resources of the same type are created together
+    batch_path = None
+    batch = []
     for resource in resources:
         name = resource['id']
         base_path = os.path.join(cwd, resource['from'])
         args = resource['values']
-        new_resources = create(name, base_path, args, vr_name)
-        created_resources += new_resources
 
-        if not is_virtual(base_path):
-            for key, arg in args.items():
-                if isinstance(arg, basestring) and '::' in arg:
-                    emitter, src = arg.split('::')
-                    connections.append((emitter, name, {src: key}))
+        if is_virtual(base_path):
+            if batch:
+                created_resources += create_bulk(batch_path, batch, vr_name)
+                batch = []
+            created_resources += create(name, base_path, args, vr_name)
+            continue
+
+        if base_path != batch_path and batch:
+            created_resources += create_bulk(batch_path, batch, vr_name)
+            batch = []
+        batch_path = base_path
+        batch.append((name, args))
 
-        db = load_all()
-        for emitter, reciver, mapping in connections:
-            emitter = db[emitter]
-            reciver = db[reciver]
-            signals.connect(emitter, reciver, mapping)
+        for key, arg in args.items():
+            if isinstance(arg, basestring) and '::' in arg:
+                emitter, src = arg.split('::')
+                connections.append((emitter, name, {src: key}))
+
+    if batch:
+        created_resources += create_bulk(batch_path, batch, vr_name)
+
+    # all connections are resolved once, after everything is created
+    resources = {r.name: r for r in created_resources}
+    resources.update(load_many(
+        {emitter for emitter, _, _ in connections} - set(resources)))
+    for emitter, reciver, mapping in connections:
+        signals.connect(resources[emitter], resources[reciver], mapping)
 
     return created_resources
 
@@ -160,13 +196,19 @@ def find_missing_connections():
     return list(ret)
 
 
-def _compile_file(name, path, kwargs):
+def _load_virtual(path):
     with open(path) as f:
         content = f.read()
 
-    inputs = get_inputs(content)
-    template = _get_template(name, content, kwargs, inputs)
-    return template
+    return get_inputs(content), Template(content)
+
+
+_virtual_cache = utils.FileCache(_load_virtual)
+
+
+def _compile_file(name, path, kwargs):
+    inputs, template = _virtual_cache.get(path)
+    return _get_template(name, template, kwargs, inputs)
 
 
 def get_inputs(content):
@@ -175,14 +217,13 @@ def get_inputs(content):
     return meta.find_undeclared_variables(ast)
 
 
-def _get_template(name, content, kwargs, inputs):
+def _get_template(name, template, kwargs, inputs):
     missing = []
     for input in inputs:
         if input not in kwargs:
             missing.append(input)
     if missing:
         raise Exception('[{0}] Validation error. Missing data in input: {1}'.format(name, missing))
-    template = Template(content)
     template = template.render(str=str, zip=zip, **kwargs)
     return template
 
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 from collections import defaultdict
+from copy import deepcopy
 import itertools
 import networkx as nx
 
 from solar.core.log import log
+from solar.core import validation
 from solar.interfaces.db import get_db
 from solar.events.api import add_events
 from solar.events.controls import Dependency
@@ -12,6 +14,25 @@ db = get_db()
 
 
 class Connections(object):
+    """Connections are stored per edge with forward and reverse indexes:
+
+    connection:<emitter_name>:<emitter_input_name>:
+      - [dst_name, dst_input_name]
+
+    connection_reverse:<dst_name>:<dst_input_name>:
+      - [emitter_name, emitter_input_name]
+
+    connection_inputs:<emitter_name>:
+      - emitter_input_name
+
+    so that adding, removing and looking up a single edge doesn't need
+    to read the whole collection.
+    """
+
+    @staticmethod
+    def _key(name, input_name):
+        return '{}:{}'.format(name, input_name)
+
     @staticmethod
     def read_clients():
         """
@@ -21,83 +42,126 @@ class Connections(object):
           emitter_input_name:
             - - dst_name
               - dst_input_name
+        """
 
-        while DB structure is:
+        emitters = db.get_uids(collection=db.COLLECTIONS.connection_inputs)
+        inputs = db.read_sets(
+            emitters, collection=db.COLLECTIONS.connection_inputs)
 
-        emitter_name_key:
-          emitter: emitter_name
-          sources:
-            emitter_input_name:
-              - - dst_name
-                - dst_input_name
-        """
+        keys = [
+            (emitter_name, emitter_input_name)
+            for emitter_name, emitter_inputs in zip(emitters, inputs)
+            for emitter_input_name in emitter_inputs
+        ]
+        destinations = db.read_sets(
+            [Connections._key(*key) for key in keys],
+            collection=db.COLLECTIONS.connection)
 
         ret = {}
 
-        for data in db.get_list(collection=db.COLLECTIONS.connection):
-            ret[data['emitter']] = data['sources']
+        for emitter_name in emitters:
+            ret[emitter_name] = {}
+
+        for (emitter_name, emitter_input_name), dsts in zip(keys, destinations):
+            ret[emitter_name][emitter_input_name] = sorted(dsts)
 
         return ret
 
     @staticmethod
-    def save_clients(clients):
-        data = []
-
-        for emitter_name, sources in clients.items():
-            data.append((
-                emitter_name,
-                {
-                    'emitter': emitter_name,
-                    'sources': sources,
-                }))
+    def read_emitter_clients(emitter_name):
+        """Same as read_clients()[emitter_name], but reads only
+        connections of given emitter.
+        """
+        inputs = db.read_set(
+            emitter_name, collection=db.COLLECTIONS.connection_inputs)
+        destinations = db.read_sets(
+            [Connections._key(emitter_name, i) for i in inputs],
+            collection=db.COLLECTIONS.connection)
 
-        db.save_list(data, collection=db.COLLECTIONS.connection)
+        return {i: sorted(dsts) for i, dsts in zip(inputs, destinations)}
 
     @staticmethod
     def add(emitter, src, receiver, dst):
         if src not in emitter.args:
             return
 
-        clients = Connections.read_clients()
-
         # TODO: implement general circular detection, this one is simple
-        if [emitter.name, src] in clients.get(receiver.name, {}).get(dst, []):
+        if [emitter.name, src] in Connections.receivers(receiver.name, dst):
             raise Exception('Attempted to create cycle in dependencies. Not nice.')
 
-        clients.setdefault(emitter.name, {})
-        clients[emitter.name].setdefault(src, [])
-        if [receiver.name, dst] not in clients[emitter.name][src]:
-            clients[emitter.name][src].append([receiver.name, dst])
-
-        Connections.save_clients(clients)
+        db.add_to_set(
+            emitter.name, [src],
+            collection=db.COLLECTIONS.connection_inputs)
+        db.add_to_set(
+            Connections._key(emitter.name, src), [[receiver.name, dst]],
+            collection=db.COLLECTIONS.connection)
+        db.add_to_set(
+            Connections._key(receiver.name, dst), [[emitter.name, src]],
+            collection=db.COLLECTIONS.connection_reverse)
+        Connections._mark_dirty(receiver.name)
 
     @staticmethod
     def remove(emitter, src, receiver, dst):
-        clients = Connections.read_clients()
+        Connections.remove_by_name(emitter.name, src, receiver.name, dst)
+
+    @staticmethod
+    def remove_by_name(emitter_name, src, receiver_name, dst):
+        db.remove_from_set(
+            Connections._key(emitter_name, src), [[receiver_name, dst]],
+            collection=db.COLLECTIONS.connection)
+        db.remove_from_set(
+            Connections._key(receiver_name, dst), [[emitter_name, src]],
+            collection=db.COLLECTIONS.connection_reverse)
+        Connections._mark_dirty(receiver_name)
+
+    @staticmethod
+    def _mark_dirty(receiver_name):
+        # receiver's staged data includes emitters of its inputs
+        from solar.core import resource
+
+        resource.mark_dirty([receiver_name])
 
-        clients[emitter.name][src] = [
-            destination for destination in clients[emitter.name][src]
-            if destination != [receiver.name, dst]
+    @staticmethod
+    def receivers_many(emitter_inputs):
+        """Receivers for each of (emitter_name, emitter_input_name)."""
+        return [
+            sorted(dsts) for dsts in db.read_sets(
+                [Connections._key(*key) for key in emitter_inputs],
+                collection=db.COLLECTIONS.connection)
         ]
 
-        Connections.save_clients(clients)
+    @staticmethod
+    def emitters_many(receiver_inputs):
+        """Emitters for each of (receiver_name, receiver_input_name)."""
+        return [
+            sorted(emitters) for emitters in db.read_sets(
+                [Connections._key(*key) for key in receiver_inputs],
+                collection=db.COLLECTIONS.connection_reverse)
+        ]
 
     @staticmethod
     def receivers(emitter_name, emitter_input_name):
-        return Connections.read_clients().get(emitter_name, {}).get(
-            emitter_input_name, []
-        )
+        return sorted(db.read_set(
+            Connections._key(emitter_name, emitter_input_name),
+            collection=db.COLLECTIONS.connection))
+
+    @staticmethod
+    def emitters(receiver_name, receiver_input_name):
+        return sorted(db.read_set(
+            Connections._key(receiver_name, receiver_input_name),
+            collection=db.COLLECTIONS.connection_reverse))
 
     @staticmethod
     def emitter(receiver_name, receiver_input_name):
-        for emitter_name, dest_dict in Connections.read_clients().items():
-            for emitter_input_name, destinations in dest_dict.items():
-                if [receiver_name, receiver_input_name] in destinations:
-                    return [emitter_name, emitter_input_name]
+        emitters = Connections.emitters(receiver_name, receiver_input_name)
+        if emitters:
+            return emitters[0]
 
     @staticmethod
     def clear():
         db.clear_collection(collection=db.COLLECTIONS.connection)
+        db.clear_collection(collection=db.COLLECTIONS.connection_reverse)
+        db.clear_collection(collection=db.COLLECTIONS.connection_inputs)
 
 
 def guess_mapping(emitter, receiver):
@@ -183,9 +247,9 @@ def disconnect(emitter, receiver):
     # if isinstance(receiver, basestring):
     #     receiver = resource.load(receiver)
 
-    clients = Connections.read_clients()
+    clients = Connections.read_emitter_clients(emitter.name)
 
-    for src, destinations in clients[emitter.name].items():
+    for src, destinations in clients.items():
         for destination in destinations:
             receiver_input = destination[1]
             if receiver_input in receiver.args:
@@ -205,43 +269,115 @@ def disconnect_receiver_by_input(receiver, input):
     :param input:
     :return:
     """
-    clients = Connections.read_clients()
-
-    for emitter_name, inputs in clients.items():
-        disconnect_by_src(emitter_name, input, receiver)
+    for receiver_input in receiver.args:
+        for emitter_name, src in Connections.emitters(
+                receiver.name, receiver_input):
+            if src == input:
+                Connections.remove_by_name(
+                    emitter_name, src, receiver.name, receiver_input)
 
 
 def disconnect_by_src(emitter_name, src, receiver):
-    clients = Connections.read_clients()
-
-    if src in clients[emitter_name]:
-        clients[emitter_name][src] = [
-            destination for destination in clients[emitter_name][src]
-            if destination[0] != receiver.name
-        ]
-
-        Connections.save_clients(clients)
+    for receiver_name, receiver_input in Connections.receivers(
+            emitter_name, src):
+        if receiver_name == receiver.name:
+            Connections.remove_by_name(
+                emitter_name, src, receiver_name, receiver_input)
 
 
 def notify(source, key, value):
     from solar.core.resource import load
 
-    clients = Connections.read_clients()
+    receivers = Connections.receivers(source.name, key)
+
+    log.debug('Notify %s %s %s %s', source.name, key, value, receivers)
+    for client, r_key in receivers:
+        resource = load(client)
+        log.debug('Resource found: %s', client)
+        if resource:
+            resource.update({r_key: value}, emitter=source)
+        else:
+            log.debug('Resource %s deleted?', client)
+            pass
+
+
+def propagate(source, args):
+    """Set args on source resource and pass new values to all receivers.
 
-    if source.name not in clients:
-        clients[source.name] = {}
-        Connections.save_clients(clients)
-
-    log.debug('Notify %s %s %s %s', source.name, key, value, clients[source.name])
-    if key in clients[source.name]:
-        for client, r_key in clients[source.name][key]:
-            resource = load(client)
-            log.debug('Resource found: %s', client)
-            if resource:
-                resource.update({r_key: value}, emitter=source)
-            else:
-                log.debug('Resource %s deleted?', client)
-                pass
+    Inputs affected by the change are collected over the connection index,
+    one pipelined read per level, and evaluated in topological order in
+    memory, so every resource is computed once, no matter how many paths
+    lead to it. All changed resources are saved with one pipelined write.
+
+    :param source: Resource
+    :param args: {input_name: value}
+    """
+    from solar.core import resource
+
+    source.apply_args(dict(source.args_dict(), **args))
+
+    graph = nx.DiGraph()
+    frontier = [(source.name, input_name) for input_name in args]
+    graph.add_nodes_from(frontier)
+
+    while frontier:
+        next_frontier = []
+        for emitter, receivers in zip(
+                frontier, Connections.receivers_many(frontier)):
+            for receiver in map(tuple, receivers):
+                if receiver not in graph:
+                    next_frontier.append(receiver)
+                graph.add_edge(emitter, receiver)
+        frontier = next_frontier
+
+    resources = resource.load_many(
+        set(name for name, _ in graph) - set([source.name]))
+    resources[source.name] = source
+
+    changed = set([source.name])
+    for node in nx.topological_sort(graph):
+        receiver_name, receiver_input = node
+        if receiver_name not in resources:
+            log.debug('Resource %s deleted?', receiver_name)
+            continue
+
+        receiver = resources[receiver_name]
+        for emitter_name, emitter_input in graph.predecessors(node):
+            if emitter_name not in resources:
+                continue
+
+            value = resources[emitter_name].metadata['input'][emitter_input]
+            _pass_value(
+                receiver, receiver_input,
+                emitter_name, emitter_input, deepcopy(value.get('value')))
+            changed.add(receiver_name)
+
+    log.debug('Propagated %s from %s to %s', args, source.name, changed)
+    resource.save_all([resources[name] for name in changed])
+
+
+def _pass_value(receiver, receiver_input, emitter_name, emitter_input, value):
+    """Same as Observer.notify/ListObserver.notify, but in memory."""
+    metadata_input = receiver.metadata['input'][receiver_input]
+    type_ = validation.schema_input_type(metadata_input.get('schema', 'str'))
+
+    if type_ != 'list':
+        metadata_input['value'] = value
+        return
+
+    formatted = {
+        'emitter': emitter_input,
+        'emitter_attached_to': emitter_name,
+        'value': value,
+    }
+    values = metadata_input.get('value') or []
+    for idx, item in enumerate(values):
+        if item['emitter_attached_to'] == emitter_name:
+            values[idx] = formatted
+            break
+    else:
+        values.append(formatted)
+    metadata_input['value'] = values
 
 
 def assign_connections(receiver, connections):
@@ -0,0 +1,48 @@
+"""Encoding of values stored in the DB.
+
+Every codec except JSON prefixes encoded value with a tag, so values
+written by any codec (and data written before codecs were introduced,
+which is plain JSON) can always be decoded, regardless of the codec
+currently used for writes.
+"""
+
+import json
+
+import msgpack
+
+
+class JSONCodec(object):
+
+    # NOTE: JSON values are not tagged, to stay readable by external
+    # consumers, e.g. hiera-redis backend
+    tag = ''
+
+    def encode(self, value):
+        return json.dumps(value)
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class MsgpackCodec(object):
+
+    tag = '\x00\x01'
+
+    def encode(self, value):
+        return self.tag + msgpack.packb(value)
+
+    def loads(self, data):
+        return msgpack.unpackb(data, encoding='utf-8')
+
+
+JSON = JSONCodec()
+MSGPACK = MsgpackCodec()
+
+CODECS = [MSGPACK]
+
+
+def decode(data):
+    for codec in CODECS:
+        if data.startswith(codec.tag):
+            return codec.loads(data[len(codec.tag):])
+    return JSON.loads(data)
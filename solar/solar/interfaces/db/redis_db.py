@@ -5,79 +5,213 @@ import fakeredis
 
 from solar import utils
 from solar import errors
+from solar.interfaces.db import codecs
 
 
 class RedisDB(object):
     COLLECTIONS = Enum(
         'Collections',
-        'connection resource state_data state_log events'
+        'connection connection_reverse connection_inputs '
+        'resource resource_meta state_data state_log events '
+        'puppet_modules'
     )
     DB = {
         'host': 'localhost',
         'port': 6379,
     }
     REDIS_CLIENT = redis.StrictRedis
-
+    # COUNT hint for SCAN and size of MGET/DEL batches
+    SCAN_COUNT = 1000
+    # codec used to write values, see codecs module
+    CODEC = codecs.MSGPACK
+    # NOTE: resources are read by hiera-redis backend, which expects JSON
+    COLLECTION_CODECS = {
+        'resource': codecs.JSON,
+    }
 
     def __init__(self):
         self._r = self.REDIS_CLIENT(**self.DB)
         self.entities = {}
 
     def read(self, uid, collection=COLLECTIONS.resource):
-        try:
-            return json.loads(
-                self._r.get(self._make_key(collection, uid))
-            )
-        except TypeError:
+        value = self._r.get(self._make_key(collection, uid))
+        if value is None:
             return None
+        return codecs.decode(value)
+
+    def read_list(self, uids, collection=COLLECTIONS.resource):
+        """Read values for uids with MGET, None for missing ones."""
+        ret = []
+
+        for i in range(0, len(uids), self.SCAN_COUNT):
+            keys = [
+                self._make_key(collection, uid)
+                for uid in uids[i:i + self.SCAN_COUNT]
+            ]
+            ret.extend(
+                codecs.decode(value) if value is not None else None
+                for value in self._r.mget(keys)
+            )
 
-    def get_list(self, collection=COLLECTIONS.resource):
-        key_glob = self._make_key(collection, '*')
-
-        keys = self._r.keys(key_glob)
-
-        with self._r.pipeline() as pipe:
-            pipe.multi()
-
-            values = [self._r.get(key) for key in keys]
+        return ret
 
-            pipe.execute()
+    def get_list(self, collection=COLLECTIONS.resource, count=None):
+        """Stream decoded values of the collection.
 
-        for value in values:
-            yield json.loads(value)
+        Keys are fetched incrementally with SCAN, so the shared Redis is
+        never blocked by KEYS, and values are read with one MGET per
+        chunk of `count` keys.
+        """
+        for keys in self._scan_chunks(collection, count=count):
+            for value in self._r.mget(keys):
+                # key could be deleted between SCAN and MGET
+                if value is None:
+                    continue
+                yield codecs.decode(value)
 
     def save(self, uid, data, collection=COLLECTIONS.resource):
         ret = self._r.set(
             self._make_key(collection, uid),
-            json.dumps(data)
+            self._codec(collection).encode(data)
         )
 
         return ret
 
-    def save_list(self, lst, collection=COLLECTIONS.resource):
-        with self._r.pipeline() as pipe:
-            pipe.multi()
+    def save_list(self, lst, collection=COLLECTIONS.resource, pipe=None):
+        codec = self._codec(collection)
+        _pipe = pipe or self._r.pipeline()
 
-            for uid, data in lst:
-                key = self._make_key(collection, uid)
-                pipe.set(key, json.dumps(data))
+        for uid, data in lst:
+            key = self._make_key(collection, uid)
+            _pipe.set(key, codec.encode(data))
 
-            pipe.execute()
+        if pipe is None:
+            _pipe.execute()
 
     def clear(self):
         self._r.flushdb()
 
-    def get_set(self, collection):
-        return OrderedSet(self._r, collection)
+    def add_to_set(self, uid, values, collection=COLLECTIONS.resource):
+        if not values:
+            return
+        self._r.sadd(
+            self._make_key(collection, uid),
+            *[self._encode_member(v) for v in values]
+        )
+
+    def remove_from_set(self, uid, values, collection=COLLECTIONS.resource):
+        if not values:
+            return
+        self._r.srem(
+            self._make_key(collection, uid),
+            *[self._encode_member(v) for v in values]
+        )
+
+    def read_set(self, uid, collection=COLLECTIONS.resource):
+        return [
+            json.loads(v) for v in
+            self._r.smembers(self._make_key(collection, uid))
+        ]
+
+    def read_sets(self, uids, collection=COLLECTIONS.resource):
+        with self._r.pipeline() as pipe:
+            for uid in uids:
+                pipe.smembers(self._make_key(collection, uid))
+
+            values = pipe.execute()
+
+        return [[json.loads(v) for v in members] for members in values]
+
+    def get_uids(self, collection=COLLECTIONS.resource, count=None):
+        prefix = self._make_key(collection, '')
+
+        return [
+            key[len(prefix):]
+            for keys in self._scan_chunks(collection, count=count)
+            for key in keys
+        ]
 
-    def clear_collection(self, collection=COLLECTIONS.resource):
+    def _scan_chunks(self, collection, count=None):
+        """Yield lists of at most `count` unique keys of the collection."""
+        count = count or self.SCAN_COUNT
         key_glob = self._make_key(collection, '*')
 
-        self._r.delete(self._r.keys(key_glob))
+        # NOTE: SCAN is allowed to return the same key more than once
+        seen = set()
+        chunk = []
+        for key in self._r.scan_iter(match=key_glob, count=count):
+            if key in seen:
+                continue
+            seen.add(key)
+            chunk.append(key)
+
+            if len(chunk) >= count:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    def push(self, uid, values, collection=COLLECTIONS.resource):
+        """Append values to the list, returns new length of the list."""
+        return self._r.rpush(
+            self._make_key(collection, uid),
+            *[self._codec(collection).encode(v) for v in values]
+        )
+
+    def list_head(self, uid, count, collection=COLLECTIONS.resource):
+        """Up to `count` first values of the list."""
+        values = self._r.lrange(self._make_key(collection, uid), 0, count - 1)
+        return [codecs.decode(v) for v in values]
+
+    def trim_head(self, uid, count, collection=COLLECTIONS.resource):
+        """Remove `count` first values of the list."""
+        self._r.ltrim(self._make_key(collection, uid), count, -1)
+
+    def list_length(self, uid, collection=COLLECTIONS.resource):
+        return self._r.llen(self._make_key(collection, uid))
+
+    def set_flag(self, uid, ttl, collection=COLLECTIONS.resource):
+        """Set flag if it is not set yet, returns True if it was set."""
+        return bool(self._r.set(
+            self._make_key(collection, uid), 1, ex=ttl, nx=True))
+
+    def pipeline(self):
+        """Transaction for writes of several sets and hashes."""
+        return self._r.pipeline()
+
+    def get_set(self, collection):
+        return OrderedSet(self._r, collection, self._codec(collection))
+
+    def get_hash(self, uid, collection=COLLECTIONS.resource):
+        return Hash(
+            self._r, self._make_key(collection, uid), self._codec(collection))
+
+    def clear_collection(self, collection=COLLECTIONS.resource, count=None):
+        # keys are collected before deleting, to not modify keyspace
+        # while it is being scanned
+        chunks = list(self._scan_chunks(collection, count=count))
+
+        with self._r.pipeline() as pipe:
+            for keys in chunks:
+                pipe.delete(*keys)
+
+            pipe.execute()
 
     def delete(self, uid, collection=COLLECTIONS.resource):
         self._r.delete(self._make_key(collection, uid))
 
+    def _codec(self, collection):
+        if isinstance(collection, self.COLLECTIONS):
+            collection = collection.name
+        return self.COLLECTION_CODECS.get(collection, self.CODEC)
+
+    @staticmethod
+    def _encode_member(value):
+        # NOTE: set members are compared by their encoded form, so the
+        # encoding has to be stable between writes
+        return json.dumps(value, sort_keys=True)
+
     def _make_key(self, collection, _id):
         if isinstance(collection, self.COLLECTIONS):
             collection = collection.name
@@ -87,54 +221,176 @@ class RedisDB(object):
 
 
 class OrderedSet(object):
+    """Hash of encoded values, ordered by a sorted set of keys.
 
-    def __init__(self, client, collection):
+    Every bulk operation takes a constant number of round trips.
+    """
+
+    # number of items read with one ZRANGEBYSCORE/HMGET by iter_from
+    PAGE_SIZE = 1000
+
+    def __init__(self, client, collection, codec=codecs.JSON):
         self.r = client
         self.collection = collection
+        self.codec = codec
         self.order_counter = '{}:incr'.format(collection)
         self.order = '{}:order'.format(collection)
 
-    def add(self, items):
-        pipe = self.r.pipeline()
-        for key, value in items:
-            count = self.r.incr(self.order_counter)
-            pipe.zadd(self.order, count, key)
-            pipe.hset(self.collection, key, json.dumps(value))
-        pipe.execute()
-
-    def rem(self, keys):
-        pipe = self.r.pipeline()
-        for key in keys:
-            pipe.zrem(self.order, key)
-            pipe.hdel(self.collection, key)
-        pipe.execute()
+    def add(self, items, pipe=None):
+        items = list(items)
+        if not items:
+            return
+        # scores for all items are allocated at once
+        last = self.r.incrby(self.order_counter, len(items))
+        first = last - len(items) + 1
+
+        _pipe = pipe or self.r.pipeline()
+        scores = []
+        for score, (key, _) in enumerate(items, first):
+            scores.extend((score, key))
+        _pipe.zadd(self.order, *scores)
+        _pipe.hmset(
+            self.collection,
+            {key: self.codec.encode(value) for key, value in items})
+        if pipe is None:
+            _pipe.execute()
+
+    def rem(self, keys, pipe=None):
+        keys = list(keys)
+        if not keys:
+            return
+        _pipe = pipe or self.r.pipeline()
+        _pipe.zrem(self.order, *keys)
+        _pipe.hdel(self.collection, *keys)
+        if pipe is None:
+            _pipe.execute()
 
     def get(self, key):
         value = self.r.hget(self.collection, key)
         if value:
-            return json.loads(value)
+            return codecs.decode(value)
         return None
 
-    def update(self, key, value):
-        self.r.hset(self.collection, key, json.dumps(value))
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [
+            codecs.decode(value) if value else None
+            for value in self.r.hmget(self.collection, keys)
+        ]
+
+    def update(self, key, value, pipe=None):
+        (pipe or self.r).hset(self.collection, key, self.codec.encode(value))
 
     def clean(self):
-        self.rem(self.r.zrange(self.order, 0, -1))
+        self.r.delete(self.order, self.collection)
 
     def rem_left(self, n=1):
         self.rem(self.r.zrevrange(self.order, 0, n-1))
 
     def reverse(self, n=1):
-        result = []
-        for key in self.r.zrevrange(self.order, 0, n-1):
-            result.append(self.get(key))
-        return result
+        return self._values(self.r.zrevrange(self.order, 0, n-1))
 
     def list(self, n=0):
-        result = []
-        for key in self.r.zrange(self.order, 0, n-1):
-            result.append(self.get(key))
-        return result
+        return self._values(self.r.zrange(self.order, 0, n-1))
+
+    def range(self, start=0, stop=None):
+        """Values with positions from start to stop (excluding), in order."""
+        if stop is not None and stop <= start:
+            return []
+        end = -1 if stop is None else stop - 1
+        return self._values(self.r.zrange(self.order, start, end))
+
+    def iter_from(self, score=0, count=None):
+        """Iterate over (score, value) of items with score above `score`.
+
+        Items are read by pages, last returned score can be used as a
+        cursor to continue iteration later.
+        """
+        count = count or self.PAGE_SIZE
+        while True:
+            page = self.r.zrangebyscore(
+                self.order, '({}'.format(score), '+inf',
+                start=0, num=count, withscores=True)
+            if not page:
+                return
+            values = self.get_many([key for key, _ in page])
+            for (_, score), value in zip(page, values):
+                # item could be removed between ZRANGEBYSCORE and HMGET
+                if value is not None:
+                    yield int(score), value
+            score = int(page[-1][1])
+
+    def _values(self, keys):
+        return [v for v in self.get_many(keys) if v is not None]
+
+
+class Hash(object):
+    """Redis hash with encoded values, read and written per field."""
+
+    def __init__(self, client, key, codec=codecs.JSON):
+        self.r = client
+        self.key = key
+        self.codec = codec
+
+    def get(self, field, default=None):
+        value = self.r.hget(self.key, field)
+        if value is None:
+            return default
+        return codecs.decode(value)
+
+    def get_many(self, fields):
+        return [
+            codecs.decode(value) if value is not None else None
+            for value in self.r.hmget(self.key, fields)
+        ]
+
+    def set(self, field, value):
+        self.r.hset(self.key, field, self.codec.encode(value))
+
+    def set_many(self, items, pipe=None):
+        if not items:
+            return
+        (pipe or self.r).hmset(
+            self.key,
+            {field: self.codec.encode(value) for field, value in items})
+
+    def delete(self, field):
+        self.r.hdel(self.key, field)
+
+    def keys(self):
+        return self.r.hkeys(self.key)
+
+    def items(self):
+        return [
+            (field, codecs.decode(value))
+            for field, value in self.r.hgetall(self.key).items()
+        ]
+
+    def __len__(self):
+        return self.r.hlen(self.key)
+
+    def clean(self):
+        self.r.delete(self.key)
+
+    def upgrade(self):
+        """Convert a dict stored as a plain string into the hash."""
+        with self.r.pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.type(self.key) != 'string':
+                    return
+                value = codecs.decode(pipe.get(self.key))
+                pipe.multi()
+                pipe.delete(self.key)
+                if value:
+                    pipe.hmset(
+                        self.key,
+                        {k: self.codec.encode(v) for k, v in value.items()})
+                pipe.execute()
+            except redis.WatchError:
+                # someone else upgraded it concurrently
+                pass
 
 
 class FakeRedisDB(RedisDB):
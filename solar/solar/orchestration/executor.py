@@ -1,27 +1,53 @@
+from collections import OrderedDict
 
 from solar.orchestration.runner import app
 from celery import group
 
 
-def celery_executor(dg, tasks, control_tasks=()):
+# seconds between soft and hard time limit of a batch
+BATCH_REPORT_TIME = 30
+
+
+def celery_executor(dg, tasks, control_tasks=(), batch_size=None):
+    """Prepare group with tasks that can be executed.
+
+    Tasks sharing the same target are sent to its queue as a single
+    `batch` message (of at most `batch_size` tasks, if given), tasks
+    without target are sent one by one.
+    """
     to_execute = []
+    by_target = OrderedDict()
 
     for task_name in tasks:
 
         # task_id needs to be unique, so for each plan we will use
         # generated uid of this plan and task_name
         task_id = '{}:{}'.format(dg.graph['uid'], task_name)
-        task = app.tasks[dg.node[task_name]['type']]
 
         if all_success(dg, dg.predecessors(task_name)) or task_name in control_tasks:
             dg.node[task_name]['status'] = 'INPROGRESS'
-            for t in generate_task(task, dg.node[task_name], task_id):
-                to_execute.append(t)
+            target = dg.node[task_name].get('target', None)
+            if target:
+                by_target.setdefault(target, []).append((task_id, task_name))
+            else:
+                to_execute.extend(
+                    generate_task(dg.node[task_name], task_id))
+
+    for target, items in by_target.items():
+        size = batch_size or len(items)
+        for i in range(0, len(items), size):
+            chunk = items[i:i + size]
+            if len(chunk) == 1:
+                task_id, task_name = chunk[0]
+                to_execute.extend(generate_task(dg.node[task_name], task_id))
+            else:
+                to_execute.extend(generate_batch(dg, chunk, target))
     return group(to_execute)
 
 
-def generate_task(task, data, task_id):
+def generate_task(data, task_id):
 
+    task = app.tasks[data['type']]
     subtask = task.subtask(
         data['args'], task_id=task_id,
         time_limit=data.get('time_limit', None),
@@ -33,5 +59,37 @@ def generate_task(task, data, task_id):
     yield subtask
 
 
+def generate_batch(dg, items, target):
+    """One message with several tasks, executed one after another.
+
+    Soft time limit of the batch is the sum of limits of its tasks, and
+    the hard one is BATCH_REPORT_TIME later, so the batch has time to
+    report its tasks as failed when it is interrupted.
+    """
+    batch = []
+    time_limits = []
+    soft_time_limits = []
+    for task_id, task_name in items:
+        data = dg.node[task_name]
+        batch.append((task_id, data['type'], data['args']))
+        time_limits.append(data.get('time_limit', None))
+        soft_time_limits.append(
+            data.get('soft_time_limit', None) or data.get('time_limit', None))
+
+    time_limit = None
+    if all(time_limits):
+        time_limit = sum(time_limits) + BATCH_REPORT_TIME
+
+    soft_time_limit = None
+    if all(soft_time_limits):
+        soft_time_limit = sum(soft_time_limits)
+
+    subtask = app.tasks['batch'].subtask(
+        [batch], time_limit=time_limit, soft_time_limit=soft_time_limit)
+    subtask.set(queue=target)
+
+    yield subtask
+
+
 def all_success(dg, nodes):
     return all((dg.node[n]['status'] == 'SUCCESS' for n in nodes))
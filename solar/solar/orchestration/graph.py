@@ -1,6 +1,8 @@
 
 
+from collections import OrderedDict
 import json
+import time
 import uuid
 
 import networkx as nx
@@ -8,31 +10,332 @@ import redis
 import yaml
 
 from solar import utils
+from solar.orchestration import limits
+from solar.orchestration import stats
+from solar.orchestration import traversal
 
 
 r = redis.StrictRedis(host='10.0.0.2', port=6379, db=1)
 
 
+# Plan is stored as:
+#
+#   <uid>:attributes  - graph attributes
+#   <uid>:nodes       - static parameters of tasks
+#   <uid>:edges       - edges, written only when plan is created or updated
+#   <uid>:revision    - incremented every time structure of plan changes
+#   <uid>:task:<name> - hash with mutable fields of a task (status, errmsg,
+#                       timestamps of the last execution, see TIMING_FIELDS)
+#
+# so changing status of a task doesn't require rewriting the whole plan.
+#
+# Scheduler state is maintained incrementally on each status transition:
+#
+#   <uid>:remaining   - hash with number of not visited predecessors of task
+#   <uid>:ready       - set of tasks that can be scheduled
+#   <uid>:inprogress  - hash with counters of tasks in flight, see
+#                       limits.InProgress
+
+# enqueued_at is set by scheduler, the rest by worker executing the task
+TIMING_FIELDS = ('enqueued_at', 'started_at', 'finished_at', 'hostname')
+TASK_FIELDS = ('status', 'errmsg') + TIMING_FIELDS
+
+# hash with duration of the last execution of tasks, shared by all plans,
+# so tasks of new plans can be prioritized (see limits.priorities)
+DURATIONS = 'task_durations'
+
+# uid -> (revision, graph without task fields), at most MAX_STRUCTURES
+# least recently used plans are kept
+_structures = OrderedDict()
+MAX_STRUCTURES = 32
+
+
+def _task_key(name, task_name):
+    return '{}:task:{}'.format(name, task_name)
+
+
+def _task_mapping(data):
+    return {k: json.dumps(data.get(k)) for k in TASK_FIELDS if k in data}
+
+
+def enqueued_fields():
+    """Fields of the task moved to INPROGRESS, timings of the previous
+    execution are cleared."""
+    fields = dict.fromkeys(TIMING_FIELDS)
+    fields.update(status='INPROGRESS', enqueued_at=time.time())
+    return fields
+
+
 def save_graph(name, graph):
     # maybe it is possible to store part of information in AsyncResult backend
-    r.set('{}:nodes'.format(name), json.dumps(graph.node.items()))
-    r.set('{}:edges'.format(name), json.dumps(graph.edges(data=True)))
-    r.set('{}:attributes'.format(name), json.dumps(graph.graph))
+    priorities = limits.priorities(graph, get_durations())
+    for task_name, priority in priorities.items():
+        graph.node[task_name]['priority'] = priority
+
+    nodes = [
+        (n, {k: v for k, v in data.items() if k not in TASK_FIELDS})
+        for n, data in graph.node.items()]
+
+    with r.pipeline() as pipe:
+        pipe.set('{}:nodes'.format(name), json.dumps(nodes))
+        pipe.set('{}:edges'.format(name), json.dumps(graph.edges(data=True)))
+        pipe.set('{}:attributes'.format(name), json.dumps(graph.graph))
+        for n, data in graph.node.items():
+            pipe.delete(_task_key(name, n))
+            mapping = _task_mapping(data)
+            if mapping:
+                pipe.hmset(_task_key(name, n), mapping)
+        pipe.incr('{}:revision'.format(name))
+        _save_state(pipe, name, graph)
+        pipe.execute()
+
+
+def _save_state(pipe, name, dg):
+    remaining = traversal.remaining_predecessors(dg)
+    ready = list(traversal.ready(dg, remaining))
+    inprogress = limits.InProgress(
+        dg, [t for t in dg if dg.node[t].get('status') == 'INPROGRESS'])
+
+    for key in ('remaining', 'ready', 'inprogress'):
+        pipe.delete('{}:{}'.format(name, key))
+    if remaining:
+        pipe.hmset('{}:remaining'.format(name), remaining)
+    if ready:
+        pipe.sadd('{}:ready'.format(name), *ready)
+    if inprogress.counters:
+        pipe.hmset('{}:inprogress'.format(name), inprogress.counters)
+
 
+def get_durations():
+    """Last execution time of tasks, by task name."""
+    return {k: float(v) for k, v in r.hgetall(DURATIONS).items()}
+
+
+def set_finished(name, task_names):
+    """Store finish time of tasks, and remember how long they took.
+
+    Only for tasks executed on their own, see set_timings for tasks
+    executed together.
+    """
+    now = time.time()
+    tasks = get_tasks(name, task_names)
+    with r.pipeline() as pipe:
+        for task_name in task_names:
+            pipe.hmset(
+                _task_key(name, task_name),
+                _task_mapping({'finished_at': now}))
+            started_at = tasks[task_name].get('started_at')
+            if started_at is not None:
+                pipe.hset(DURATIONS, task_name, now - started_at)
+        pipe.execute()
+
+
+def set_timings(name, timings):
+    """Store start and finish time of tasks measured by the worker.
+
+    :param timings: {task_name: (started_at, finished_at, exact)}, time of
+                    not exact tasks is only a share of time of several
+                    tasks executed together and isn't remembered as their
+                    duration
+    """
+    with r.pipeline() as pipe:
+        for task_name, (started_at, finished_at, exact) in timings.items():
+            pipe.hmset(
+                _task_key(name, task_name),
+                _task_mapping({'started_at': started_at,
+                               'finished_at': finished_at}))
+            if exact:
+                pipe.hset(DURATIONS, task_name, finished_at - started_at)
+        pipe.execute()
+
+
+def save_state(name, dg):
+    """Recalculate scheduler state from statuses in dg."""
+    with r.pipeline() as pipe:
+        _save_state(pipe, name, dg)
+        pipe.execute()
+
+
+def get_structure(name):
+    """Graph of the plan without mutable task fields.
+
+    Structure is cached per process until plan is updated, returned
+    graph is shared and must not be modified.
+    """
+    revision = r.get('{}:revision'.format(name))
+    cached = _structures.pop(name, None)
+    if cached and cached[0] == revision:
+        _structures[name] = cached
+        return cached[1]
+
+    with r.pipeline() as pipe:
+        pipe.get('{}:nodes'.format(name))
+        pipe.get('{}:edges'.format(name))
+        pipe.get('{}:attributes'.format(name))
+        nodes, edges, attributes = pipe.execute()
 
-def get_graph(name):
     dg = nx.MultiDiGraph()
-    nodes = json.loads(r.get('{}:nodes'.format(name)))
-    edges = json.loads(r.get('{}:edges'.format(name)))
-    dg.graph = json.loads(r.get('{}:attributes'.format(name)))
-    dg.add_nodes_from(nodes)
-    dg.add_edges_from(edges)
+    dg.graph = json.loads(attributes)
+    dg.add_nodes_from(json.loads(nodes))
+    dg.add_edges_from(json.loads(edges))
+
+    _structures[name] = (revision, dg)
+    while len(_structures) > MAX_STRUCTURES:
+        _structures.popitem(last=False)
+    return dg
+
+
+def get_tasks(name, task_names):
+    """Mutable fields of given tasks, read with a single round trip."""
+    with r.pipeline() as pipe:
+        for task_name in task_names:
+            pipe.hgetall(_task_key(name, task_name))
+        values = pipe.execute()
+
+    return {
+        task_name: {k: json.loads(v) for k, v in data.items()}
+        for task_name, data in zip(task_names, values)
+    }
+
+
+def update_task(name, task_name, **fields):
+    """Atomically set mutable fields (status, errmsg) of a single task."""
+    r.hmset(_task_key(name, task_name), _task_mapping(fields))
+
+
+def update_tasks(name, tasks):
+    """:param tasks: {task_name: {field: value}}"""
+    if not tasks:
+        return
+    with r.pipeline() as pipe:
+        for task_name, fields in tasks.items():
+            pipe.hmset(_task_key(name, task_name), _task_mapping(fields))
+        pipe.execute()
+
+
+def get_graph(name, nodes=None):
+    """Plan graph with task fields loaded.
+
+    If `nodes` are given, only subgraph with those nodes is returned.
+    """
+    structure = get_structure(name)
+    if nodes is None:
+        dg = structure.copy()
+    else:
+        dg = structure.subgraph(nodes).copy()
+    for task_name, data in get_tasks(name, dg.nodes()).items():
+        dg.node[task_name].update(data)
     return dg
 
 
 get_plan = get_graph
 
 
+def get_ready(name):
+    return r.smembers('{}:ready'.format(name))
+
+
+def get_inprogress(name, dg):
+    inprogress = limits.InProgress(dg)
+    inprogress.counters.update(
+        {k: int(v) for k, v in
+         r.hgetall('{}:inprogress'.format(name)).items()})
+    return inprogress
+
+
+def start_tasks(name, select):
+    """Atomically move tasks chosen by `select` to INPROGRESS.
+
+    `select(dg, ready, inprogress)` gets subgraph with ready tasks and
+    their predecessors and returns tasks that should be started.
+    Ready set and counters of tasks in flight are watched, so if another
+    scheduler modified them meanwhile selection is repeated with fresh
+    data and every task is started exactly once.
+
+    Returns subgraph and started tasks.
+    """
+    ready_key = '{}:ready'.format(name)
+    inprogress_key = '{}:inprogress'.format(name)
+    structure = get_structure(name)
+
+    with r.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(ready_key, inprogress_key)
+                ready = sorted(pipe.smembers(ready_key))
+                counters = pipe.hgetall(inprogress_key)
+
+                nodes = set(ready)
+                for t in ready:
+                    nodes.update(structure.predecessors(t))
+                dg = get_graph(name, nodes)
+                inprogress = limits.InProgress(dg)
+                inprogress.counters.update(
+                    {k: int(v) for k, v in counters.items()})
+
+                tasks = select(dg, ready, inprogress)
+
+                pipe.multi()
+                if tasks:
+                    pipe.srem(ready_key, *tasks)
+                for task_name in tasks:
+                    pipe.hmset(
+                        _task_key(name, task_name),
+                        _task_mapping(enqueued_fields()))
+                    for key in limits.InProgress.keys(dg, task_name):
+                        pipe.hincrby(inprogress_key, key, 1)
+                pipe.execute()
+                return dg, tasks
+            except redis.WatchError:
+                continue
+
+
+def finish_task(name, task_name, status, errmsg=None):
+    """Set result of INPROGRESS task and update ready set.
+
+    Only successors of the task are touched. Status is changed with
+    compare-and-set, returns False if task was not INPROGRESS (e.g.
+    result was already reported by someone else).
+    """
+    structure = get_structure(name)
+    successors = structure.successors(task_name)
+    task_key = _task_key(name, task_name)
+
+    with r.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(task_key)
+                current = pipe.hget(task_key, 'status')
+                if current is None or json.loads(current) != 'INPROGRESS':
+                    return False
+
+                pipe.multi()
+                pipe.hmset(task_key, _task_mapping(
+                    {'status': status, 'errmsg': errmsg}))
+                for key in limits.InProgress.keys(structure, task_name):
+                    pipe.hincrby('{}:inprogress'.format(name), key, -1)
+                if status in traversal.VISITED:
+                    for s in successors:
+                        pipe.hincrby('{}:remaining'.format(name), s, -1)
+                result = pipe.execute()
+                break
+            except redis.WatchError:
+                continue
+
+    if status not in traversal.VISITED or not successors:
+        return True
+    # HINCRBY is atomic, so only one of predecessors sees zero
+    candidates = [
+        s for s, left in zip(successors, result[-len(successors):])
+        if left == 0]
+    if candidates:
+        tasks = get_tasks(name, candidates)
+        ready = [t for t in candidates if tasks[t].get('status') == 'PENDING']
+        if ready:
+            r.sadd('{}:ready'.format(name), *ready)
+    return True
+
+
 def parse_plan(plan_data):
     """ parses yaml definition and returns graph
     """
@@ -96,10 +399,13 @@ def update_plan(uid, plan_data):
 
 def reset(uid, states=None):
     dg = get_graph(uid)
-    for n in dg:
-        if states is None or dg.node[n]['status'] in states:
-            dg.node[n]['status'] = 'PENDING'
-    save_graph(uid, dg)
+    changed = {
+        n: {'status': 'PENDING'} for n in dg
+        if states is None or dg.node[n]['status'] in states}
+    for n, data in changed.items():
+        dg.node[n].update(data)
+    update_tasks(uid, changed)
+    save_state(uid, dg)
 
 
 def report_topo(uid):
@@ -108,6 +414,8 @@ def report_topo(uid):
     report = []
 
     for task in nx.topological_sort(dg):
-        report.append([task, dg.node[task]['status'], dg.node[task]['errmsg']])
+        data = dg.node[task]
+        report.append(
+            [task, data['status'], data['errmsg'], stats.durations(data)])
 
     return report
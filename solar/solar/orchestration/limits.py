@@ -1,10 +1,61 @@
+from collections import Counter
+
+import networkx as nx
+
+
+class InProgress(object):
+    """Tasks in flight, counted per target and per resource type.
+
+    Counters are maintained incrementally, so rules don't need to walk
+    through all in progress tasks for every candidate.
+    """
+
+    def __init__(self, dg, items=()):
+        self.dg = dg
+        self.counters = Counter()
+        for item in items:
+            self.append(item)
+
+    @staticmethod
+    def keys(dg, item):
+        """Counters affected by item."""
+        data = dg.node[item]
+        keys = ['total']
+        if data.get('target'):
+            keys.append('target:{}'.format(data['target']))
+        if data.get('resource_type'):
+            keys.append('type:{}'.format(data['resource_type']))
+        return keys
+
+    def append(self, item):
+        for key in self.keys(self.dg, item):
+            self.counters[key] += 1
+
+    def remove(self, item):
+        for key in self.keys(self.dg, item):
+            self.counters[key] -= 1
+
+    def target(self, target):
+        return self.counters['target:{}'.format(target)]
+
+    def type(self, _type):
+        return self.counters['type:{}'.format(_type)]
+
+    def __len__(self):
+        return self.counters['total']
+
+
+def _in_progress(dg, inprogress):
+    if isinstance(inprogress, InProgress):
+        return inprogress
+    return InProgress(dg, inprogress)
 
 
 class Chain(object):
 
     def __init__(self, dg, inprogress, added):
         self.dg = dg
-        self.inprogress = inprogress
+        self.inprogress = _in_progress(dg, inprogress)
         self.added = added
         self.rules = []
 
@@ -25,8 +76,31 @@ class Chain(object):
         return iter(self.filtered)
 
 
+def priorities(dg, durations):
+    """Longest path from every task till the end of the plan.
+
+    Length of a path is the sum of durations of its tasks, tasks that
+    were never executed before get the average duration.
+
+    :param durations: {task_name: seconds} of previous executions
+    """
+    known = [durations[t] for t in dg if t in durations]
+    default = float(sum(known)) / len(known) if known else 1.0
+
+    ret = {}
+    for task in reversed(nx.topological_sort(dg)):
+        longest = max([ret[s] for s in dg.successors(task)] or [0])
+        ret[task] = durations.get(task, default) + longest
+    return ret
+
+
+def by_priority(dg, items):
+    """Tasks gating the longest remaining path go first."""
+    return sorted(items, key=lambda t: -dg.node[t].get('priority', 0))
+
+
 def get_default_chain(dg, inprogress, added):
-    chain = Chain(dg, inprogress, added)
+    chain = Chain(dg, inprogress, by_priority(dg, added))
     chain.add_rule(items_rule)
     chain.add_rule(target_based_rule)
     chain.add_rule(type_based_rule)
@@ -41,22 +115,19 @@ def type_based_rule(dg, inprogress, item):
     if not 'type_limit' in dg.node[item]: return True
     if not _type: return True
 
-    type_count = 0
-    for n in inprogress:
-        if dg.node[n].get('resource_type') == _type:
-            type_count += 1
+    type_count = _in_progress(dg, inprogress).type(_type)
     return dg.node[item]['type_limit'] > type_count
 
 
 def target_based_rule(dg, inprogress, item, limit=1):
+    """condition can be specified like:
+        target_limit: 2
+    """
     target = dg.node[item].get('target')
     if not target: return True
 
-    target_count = 0
-    for n in inprogress:
-        if dg.node[n].get('target') == target:
-            target_count += 1
-    return limit > target_count
+    limit = dg.node[item].get('target_limit', limit)
+    return limit > _in_progress(dg, inprogress).target(target)
 
 
 def items_rule(dg, inprogress, item, limit=100):
@@ -0,0 +1,107 @@
+"""Execution of plans in the current process, without celery.
+
+Plan is walked with the same traversal and limits as used by the
+scheduler, tasks are executed by a pool of worker processes (as by
+celery prefork workers, handlers rely on process global state, e.g.
+fabric env), and results are applied to the plan and the system log
+right after a task finishes.
+"""
+
+from itertools import islice
+from multiprocessing import Pool
+import Queue
+
+from solar.core.log import log
+from solar.orchestration import executor
+from solar.orchestration import graph
+from solar.orchestration import limits
+from solar.orchestration import tasks
+from solar.orchestration import traversal
+from solar.system_log import operations
+
+
+CONTROL_TASKS = ('fault_tolerance',)
+
+
+def run(plan_uid, workers=4):
+    """Execute plan until there is nothing left to run.
+
+    At most `workers` tasks are executed at once, on top of the limits
+    of the plan. Returns the graph with final statuses of tasks.
+    """
+    dg = graph.get_graph(plan_uid)
+    remaining = traversal.remaining_predecessors(dg)
+    ready = set(traversal.ready(dg, remaining))
+    inprogress = limits.InProgress(dg)
+    finished = Queue.Queue()
+    pool = Pool(workers)
+
+    try:
+        while True:
+            chain = limits.get_default_chain(dg, inprogress, sorted(ready))
+            for task_name in islice(chain, max(workers - len(inprogress), 0)):
+                ready.discard(task_name)
+                _start(plan_uid, dg, task_name, pool, finished)
+
+            if not len(inprogress):
+                break
+
+            task_name, status, errmsg = finished.get()
+            inprogress.remove(task_name)
+            ready.update(
+                _finish(plan_uid, dg, remaining, task_name, status, errmsg))
+    finally:
+        pool.close()
+        pool.join()
+        graph.save_state(plan_uid, dg)
+
+    return dg
+
+
+def _start(plan_uid, dg, task_name, pool, finished):
+    data = dg.node[task_name]
+    fields = graph.enqueued_fields()
+    data.update(fields)
+    graph.update_task(plan_uid, task_name, **fields)
+
+    if not (executor.all_success(dg, dg.predecessors(task_name))
+            or task_name in CONTROL_TASKS):
+        # the same tasks are never sent by celery_executor
+        finished.put((task_name, 'SKIPPED', 'Predecessors failed'))
+        return
+
+    task_id = '{}:{}'.format(plan_uid, task_name)
+    log.debug('Executing %s', task_id)
+
+    pool.apply_async(
+        _execute, (task_id, data['type'], data['args']),
+        callback=lambda result: finished.put((task_name,) + result))
+
+
+def _execute(task_id, task_type, args):
+    """Executed in a worker process, returns (status, errmsg)."""
+    # result has to be returned in any case, run waits for it
+    try:
+        return tasks.run_task(task_id, task_type, args)
+    except Exception as e:
+        log.exception('Failed to execute %s', task_id)
+        return 'ERROR', str(e)
+
+
+def _finish(plan_uid, dg, remaining, task_name, status, errmsg):
+    """Store result of the task, returns successors which became ready."""
+    dg.node[task_name].update({'status': status, 'errmsg': errmsg})
+    graph.update_task(plan_uid, task_name, status=status, errmsg=errmsg)
+    if status != 'SKIPPED':
+        operations.apply_events(
+            [('commit' if status == 'SUCCESS' else 'error', task_name)])
+
+    if status not in traversal.VISITED:
+        return []
+
+    ready = []
+    for s in dg.successors(task_name):
+        remaining[s] -= 1
+        if remaining[s] == 0 and dg.node[s]['status'] == 'PENDING':
+            ready.append(s)
+    return ready
@@ -0,0 +1,93 @@
+"""Output of running tasks, stored incrementally next to the plan.
+
+Output is appended to a capped list per task while the task runs, so
+it can be followed live, and only the last MAX_CHUNKS chunks are kept.
+Task results contain just a summary: size, sha1 and the tail of output.
+"""
+
+from contextlib import contextmanager
+import hashlib
+
+from solar.core import process
+from solar.orchestration import graph
+
+
+# number of chunks (of at most process.CHUNK_SIZE bytes) kept per task
+MAX_CHUNKS = 256
+# output is removed if task was not running for that long
+OUTPUT_TTL = 7 * 24 * 3600
+# size of output tail included into the summary
+TAIL_SIZE = 2048
+
+STREAMS = {'stdout': 'o', 'stderr': 'e'}
+
+
+def _key(task_id):
+    return '{}:output'.format(task_id)
+
+
+def _count_key(task_id):
+    # number of chunks ever written, to address chunks after rotation
+    return '{}:output:count'.format(task_id)
+
+
+class TaskOutput(object):
+
+    def __init__(self, task_id):
+        self.key = _key(task_id)
+        self.count_key = _count_key(task_id)
+        self.size = 0
+        self.sha1 = hashlib.sha1()
+        self.tail = ''
+
+    def write(self, stream, chunk):
+        self.size += len(chunk)
+        self.sha1.update(chunk)
+        self.tail = (self.tail + chunk)[-TAIL_SIZE:]
+
+        with graph.r.pipeline() as pipe:
+            pipe.rpush(self.key, STREAMS[stream] + chunk)
+            pipe.ltrim(self.key, -MAX_CHUNKS, -1)
+            pipe.expire(self.key, OUTPUT_TTL)
+            pipe.incr(self.count_key)
+            pipe.expire(self.count_key, OUTPUT_TTL)
+            pipe.execute()
+
+    def summary(self):
+        return {
+            'size': self.size,
+            'sha1': self.sha1.hexdigest(),
+            'tail': self.tail,
+        }
+
+
+@contextmanager
+def capture(task_id, resource_name=None):
+    """Store output of actions executed in the block for the task.
+
+    Output of the previous run of the task is removed.
+    """
+    graph.r.delete(_key(task_id), _count_key(task_id))
+    out = TaskOutput(task_id)
+    with process.output_to(out.write, resource_name):
+        yield out
+
+
+def read(task_id, position=0):
+    """Output of the task written after given position.
+
+    :return: (output, position of its end)
+    """
+    with graph.r.pipeline() as pipe:
+        pipe.get(_count_key(task_id))
+        pipe.lrange(_key(task_id), 0, -1)
+        count, chunks = pipe.execute()
+
+    count = int(count or 0)
+    # chunks before the first stored one are already rotated out
+    start = max(position - (count - len(chunks)), 0)
+    return ''.join(chunk[1:] for chunk in chunks[start:]), count
+
+
+def tail(task_id, lines=10):
+    return read(task_id)[0].splitlines()[-lines:]
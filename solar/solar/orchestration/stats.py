@@ -0,0 +1,125 @@
+"""Where execution of a plan spends its time.
+
+Everything is computed from timestamps stored with every task, see
+graph.TIMING_FIELDS.
+"""
+
+from collections import defaultdict
+
+import networkx as nx
+
+
+# upper bounds of histogram buckets, in seconds
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60, float('inf'))
+
+
+def _delta(data, start, end):
+    if data.get(start) is None or data.get(end) is None:
+        return None
+    return data[end] - data[start]
+
+
+def durations(data):
+    """Time the task waited in the queue and was executed, in seconds.
+
+    Values of not yet known durations are None.
+    """
+    return {
+        'wait': _delta(data, 'enqueued_at', 'started_at'),
+        'run': _delta(data, 'started_at', 'finished_at'),
+    }
+
+
+def critical_path(dg):
+    """Chain of dependent tasks with the longest total execution time.
+
+    :return: (list of tasks, total run time)
+    """
+    longest = {}
+    for task in nx.topological_sort(dg):
+        run = durations(dg.node[task])['run'] or 0
+        path, total = _longest_of(longest, dg.predecessors(task))
+        longest[task] = (path + [task], total + run)
+
+    if not longest:
+        return [], 0
+    return max(longest.values(), key=lambda l: l[1])
+
+
+def _longest_of(longest, tasks):
+    paths = [longest[t] for t in tasks]
+    if not paths:
+        return [], 0
+    return max(paths, key=lambda l: l[1])
+
+
+def wall_time(dg):
+    """Time from the start of the first task till finish of the last one."""
+    started = [d['started_at'] for _, d in dg.nodes(data=True)
+               if d.get('started_at') is not None]
+    finished = [d['finished_at'] for _, d in dg.nodes(data=True)
+                if d.get('finished_at') is not None]
+    if not started or not finished:
+        return 0
+    return max(finished) - min(started)
+
+
+def target_utilisation(dg):
+    """Busy time of every target, and its share of the plan wall time.
+
+    Time when several tasks of the target were running at once is
+    counted once.
+
+    :return: {target: (busy seconds, utilisation)}
+    """
+    runs = defaultdict(list)
+    for _, data in dg.nodes(data=True):
+        if data.get('target') and durations(data)['run'] is not None:
+            runs[data['target']].append(
+                (data['started_at'], data['finished_at']))
+    busy = {target: _union_length(r) for target, r in runs.items()}
+
+    total = wall_time(dg)
+    return {
+        target: (seconds, seconds / total if total else 0)
+        for target, seconds in busy.items()
+    }
+
+
+def _union_length(intervals):
+    length = 0.0
+    end = None
+    for start, finish in sorted(intervals):
+        if end is not None and start < end:
+            start = end
+        if finish > start:
+            length += finish - start
+        end = finish if end is None else max(end, finish)
+    return length
+
+
+def tick_latencies(dg):
+    """Delays between finish of the last predecessor and enqueue of task.
+
+    This is the time scheduler needed to react on finished task.
+    """
+    latencies = []
+    for task in dg:
+        enqueued_at = dg.node[task].get('enqueued_at')
+        finished = [dg.node[p].get('finished_at')
+                    for p in dg.predecessors(task)]
+        if enqueued_at is None or not finished or None in finished:
+            continue
+        latencies.append(enqueued_at - max(finished))
+    return latencies
+
+
+def histogram(values, buckets=LATENCY_BUCKETS):
+    """:return: list of (upper bound, number of values in bucket)"""
+    counts = [0] * len(buckets)
+    for value in values:
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+    return zip(buckets, counts)
@@ -1,18 +1,21 @@
 
+from contextlib import nested
 from functools import partial, wraps
 from itertools import islice
-import subprocess
+import socket
 import time
 
 from celery.app import task
+from celery.signals import task_prerun
 import redis
 
 from solar.orchestration import graph
+from solar.orchestration import output
 from solar.core import actions
+from solar.core import process
 from solar.core import resource
-from solar.system_log.tasks import commit_logitem, error_logitem
+from solar.system_log.tasks import report_logitem
 from solar.orchestration.runner import app
-from solar.orchestration.traversal import traverse
 from solar.orchestration import limits
 from solar.orchestration import executor
 
@@ -20,43 +23,187 @@ from solar.orchestration import executor
 r = redis.StrictRedis(host='10.0.0.2', port=6379, db=1)
 
 
-__all__ = ['solar_resource', 'cmd', 'sleep',
-           'error', 'fault_tolerance', 'schedule_start', 'schedule_next']
+__all__ = ['solar_resource', 'cmd', 'sleep', 'batch',
+           'error', 'fault_tolerance', 'schedule_start', 'schedule_next',
+           'schedule_next_many']
 
 # NOTE(dshulyak) i am not using celery.signals because it is not possible
 # to extract task_id from *task_success* signal
 class ReportTask(task.Task):
 
     def on_success(self, retval, task_id, args, kwargs):
+        task_finished([task_id])
         schedule_next.apply_async(args=[task_id, 'SUCCESS'], queue='scheduler')
-        commit_logitem.apply_async(args=[task_id], queue='system_log')
+        report_logitem(task_id, 'commit')
 
     def on_failure(self, exc, task_id, args, kwargs, einfo):
+        task_finished([task_id])
         schedule_next.apply_async(
             args=[task_id, 'ERROR'],
             kwargs={'errmsg': str(einfo.exception)},
             queue='scheduler')
-        error_logitem.apply_async(args=[task_id], queue='system_log')
+        report_logitem(task_id, 'error')
 
 
 report_task = partial(app.task, base=ReportTask, bind=True)
 
 
+@task_prerun.connect
+def _report_task_started(task_id=None, task=None, **kwargs):
+    if isinstance(task, ReportTask):
+        task_started([task_id])
+
+
+def _by_plan(task_ids):
+    by_plan = {}
+    for task_id in task_ids:
+        plan_uid, task_name = task_id.rsplit(':', 1)
+        by_plan.setdefault(plan_uid, []).append(task_name)
+    return by_plan.items()
+
+
+def task_started(task_ids):
+    """Store start time of tasks and host they are executed on."""
+    fields = {'started_at': time.time(), 'hostname': socket.gethostname()}
+    for plan_uid, task_names in _by_plan(task_ids):
+        graph.update_tasks(plan_uid, dict.fromkeys(task_names, fields))
+
+
+def task_finished(task_ids):
+    for plan_uid, task_names in _by_plan(task_ids):
+        graph.set_finished(plan_uid, task_names)
+
+
+def task_timings(timings):
+    """Store timings of tasks executed together, see graph.set_timings.
+
+    :param timings: {task_id: (started_at, finished_at, exact)}
+    """
+    for plan_uid, task_names in _by_plan(timings):
+        graph.set_timings(plan_uid, {
+            task_name: timings['{}:{}'.format(plan_uid, task_name)]
+            for task_name in task_names})
+
+
+@app.task(name='batch')
+def batch(tasks):
+    """Execute several tasks sent to the same queue as one message.
+
+    Results are reported with a single schedule_next_many.
+
+    Actions of solar resources are executed together, so handlers can
+    combine them (e.g. apply all puppet manifests of the node in one
+    ssh session).
+
+    :param tasks: list of (task_id, task_type, args)
+    """
+    results = []
+    try:
+        resource_tasks = [t for t in tasks if t[1] == 'solar_resource']
+        results.extend(_resource_actions(resource_tasks))
+
+        for task_id, task_type, args in tasks:
+            if task_type == 'solar_resource':
+                continue
+            status, errmsg = run_task(task_id, task_type, args)
+            results.append((task_id, status, errmsg))
+            report_logitem(
+                task_id, 'commit' if status == 'SUCCESS' else 'error')
+    except Exception as e:
+        # e.g. soft time limit of the batch, tasks without result failed
+        reported = set(task_id for task_id, _, _ in results)
+        for task_id, _, _ in tasks:
+            if task_id not in reported:
+                results.append((task_id, 'ERROR', repr(e)))
+                report_logitem(task_id, 'error')
+        raise
+    finally:
+        schedule_next_many.apply_async(args=[results], queue='scheduler')
+    return results
+
+
+def run_task(task_id, task_type, args):
+    """Execute task in the current thread, returns (status, errmsg).
+
+    Task callbacks are not called, the caller is responsible for
+    reporting of the result.
+    """
+    try:
+        task = app.tasks[task_type]
+    except KeyError:
+        return 'ERROR', 'Task type {} does not exist'.format(task_type)
+
+    task.push_request(id=task_id, args=args)
+    try:
+        task_started([task_id])
+        task.run(*args)
+    except Exception as e:
+        return 'ERROR', str(e)
+    finally:
+        task.pop_request()
+        task_finished([task_id])
+    return 'SUCCESS', None
+
+
+def _resource_actions(tasks):
+    """Execute solar_resource tasks with a single resource_actions call."""
+    if not tasks:
+        return []
+
+    task_ids = [task_id for task_id, _, _ in tasks]
+    task_started(task_ids)
+    captures = [output.capture(task_id, args[0]) for task_id, _, args in tasks]
+    with resource.session(), nested(*captures):
+        loaded = resource.load_many([args[0] for _, _, args in tasks])
+        found = [t for t in tasks if t[2][0] in loaded]
+        timed = dict(zip(
+            [task_id for task_id, _, _ in found],
+            actions.timed_resource_actions(
+                [(loaded[args[0]], args[1]) for _, _, args in found])))
+    errors = {task_id: error for task_id, (error, _) in timed.items()}
+
+    # every task gets its own time instead of time of the whole batch
+    now = time.time()
+    task_timings({
+        task_id: timed[task_id][1] if task_id in timed else (now, now, False)
+        for task_id in task_ids})
+
+    results = []
+    for task_id, _, args in tasks:
+        if task_id not in errors:
+            error = 'Resource {} does not exist'.format(args[0])
+        else:
+            error = errors[task_id]
+
+        if error is not None:
+            results.append((task_id, 'ERROR', str(error)))
+            report_logitem(task_id, 'error')
+        else:
+            results.append((task_id, 'SUCCESS', None))
+            report_logitem(task_id, 'commit')
+    return results
+
+
 @report_task(name='solar_resource')
 def solar_resource(ctxt, resource_name, action):
-    res = resource.load(resource_name)
-    return actions.resource_action(res, action)
+    """Returns summary of the action output, see output module."""
+    with resource.session(), \
+            output.capture(ctxt.request.id, resource_name) as out:
+        res = resource.load(resource_name)
+        actions.resource_action(res, action)
+    return out.summary()
 
 
 @report_task(name='cmd')
 def cmd(ctxt, cmd):
-    popen = subprocess.Popen(
-        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-    out, err = popen.communicate()
-    rcode = popen.returncode
-    if rcode:
-        raise Exception('Command %s failed with err %s', cmd, err)
-    return popen.returncode, out, err
+    """Returns summary of the command output, see output module."""
+    with output.capture(ctxt.request.id) as out:
+        result = process.run(
+            ['/bin/sh', '-c', cmd], on_output=process.output_callback())
+    if result.failed:
+        raise Exception('Command {} failed with err {}'.format(
+            cmd, out.summary()['tail']))
+    return out.summary()
 
 
 @report_task(name='sleep')
@@ -103,16 +250,23 @@ def anchor(ctxt, *args):
             raise Exception('One of the tasks erred, cant proceeed')
 
 
-def schedule(plan_uid, dg):
-    tasks = traverse(dg)
-    limit_chain = limits.get_default_chain(
-        dg,
-        [t for t in dg if dg.node[t]['status'] == 'INPROGRESS'],
-        tasks)
-    execution = executor.celery_executor(
-        dg, limit_chain, control_tasks=('fault_tolerance',))
-    graph.save_graph(plan_uid, dg)
-    execution()
+def schedule(plan_uid):
+    """Start ready tasks of the plan, allowed by limits.
+
+    Safe to run concurrently, so scheduler queue can be consumed by
+    several workers.
+    """
+    executions = []
+
+    def select(dg, ready, inprogress):
+        limit_chain = limits.get_default_chain(dg, inprogress, ready)
+        # selection is repeated on conflict, only last execution is valid
+        executions[:] = [executor.celery_executor(
+            dg, limit_chain, control_tasks=('fault_tolerance',))]
+        return [t for t in ready if dg.node[t]['status'] == 'INPROGRESS']
+
+    graph.start_tasks(plan_uid, select)
+    executions[0]()
 
 
 @app.task(name='schedule_start')
@@ -122,24 +276,37 @@ def schedule_start(plan_uid, start=None, end=None):
     - find successors that should be executed
     - apply different policies to tasks
     """
-    dg = graph.get_graph(plan_uid)
-    schedule(plan_uid, dg)
+    schedule(plan_uid)
 
 
 @app.task(name='soft_stop')
 def soft_stop(plan_uid):
     dg = graph.get_graph(plan_uid)
-    for n in dg:
-        if dg.node[n]['status'] == 'PENDING':
-            dg.node[n]['status'] = 'SKIPPED'
-    graph.save_graph(plan_uid, dg)
+    changed = {
+        n: {'status': 'SKIPPED'} for n in dg
+        if dg.node[n]['status'] == 'PENDING'}
+    for n, data in changed.items():
+        dg.node[n].update(data)
+    graph.update_tasks(plan_uid, changed)
+    graph.save_state(plan_uid, dg)
 
 
 @app.task(name='schedule_next')
 def schedule_next(task_id, status, errmsg=None):
     plan_uid, task_name = task_id.rsplit(':', 1)
-    dg = graph.get_graph(plan_uid)
-    dg.node[task_name]['status'] = status
-    dg.node[task_name]['errmsg'] = errmsg
-
-    schedule(plan_uid, dg)
+    if graph.finish_task(plan_uid, task_name, status, errmsg=errmsg):
+        schedule(plan_uid)
+
+
+@app.task(name='schedule_next_many')
+def schedule_next_many(results):
+    """:param results: list of (task_id, status, errmsg)"""
+    plans = []
+    for task_id, status, errmsg in results:
+        plan_uid, task_name = task_id.rsplit(':', 1)
+        if (graph.finish_task(plan_uid, task_name, status, errmsg=errmsg)
+                and plan_uid not in plans):
+            plans.append(plan_uid)
+
+    for plan_uid in plans:
+        schedule(plan_uid)
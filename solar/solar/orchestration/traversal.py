@@ -19,19 +19,26 @@ VISITED = ('SUCCESS', 'ERROR', 'NOOP')
 BLOCKED = ('INPROGRESS', 'SKIPPED')
 
 
-def traverse(dg):
+def remaining_predecessors(dg):
+    """Number of not yet visited predecessors for every task."""
+    return {
+        node: sum(
+            1 for p in dg.predecessors(node)
+            if dg.node[p]['status'] not in VISITED)
+        for node in dg
+    }
 
-    visited = set()
-    for node in dg:
-        data = dg.node[node]
-        if data['status'] in VISITED:
-            visited.add(node)
 
+def ready(dg, remaining):
     for node in dg:
         data = dg.node[node]
 
-        if node in visited or data['status'] in BLOCKED:
+        if data['status'] in VISITED or data['status'] in BLOCKED:
             continue
 
-        if set(dg.predecessors(node)) <= visited:
+        if remaining[node] == 0:
             yield node
+
+
+def traverse(dg):
+    return ready(dg, remaining_predecessors(dg))
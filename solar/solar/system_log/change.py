@@ -41,6 +41,7 @@ def _stage_changes(staged_resources, conn_graph,
             log.debug('CYCLE: %s', cycle)
         raise
 
+    log_items = []
     for res_uid in srt:
         commited_data = commited_resources.get(res_uid, {})
         staged_data = staged_resources.get(res_uid, {})
@@ -54,24 +55,72 @@ def _stage_changes(staged_resources, conn_graph,
                 res_uid,
                 '{}.{}'.format(res_uid, action),
                 df)
-            staged_log.append(log_item)
+            log_items.append(log_item)
+    staged_log.extend(log_items)
     return staged_log
 
 
-def stage_changes():
+def _candidates(full=False):
+    """Names of resources which could differ from commited state."""
+    if full:
+        return resource.all_resource_names()
+    return resource.dirty_resources()
+
+
+def _staged_graph(resources):
+    """Connections between given resources, used to order staged items."""
+    receiver_inputs = [
+        (r.name, input_name) for r in resources.values()
+        for input_name in r.metadata['input']
+    ]
+
+    g = nx.MultiDiGraph()
+    g.add_nodes_from(resources)
+    for (receiver_name, receiver_input), emitters in zip(
+            receiver_inputs,
+            signals.Connections.emitters_many(receiver_inputs)):
+        for emitter_name, emitter_input in emitters:
+            if emitter_name in resources:
+                label = '{}:{}'.format(emitter_input, receiver_input)
+                g.add_edge(emitter_name, receiver_name, label=label)
+    return g
+
+
+def stage_changes(full=False):
+    """Stage resources changed since last staging.
+
+    :param full: diff all resources instead of the tracked dirty ones
+    """
     log = data.SL()
     log.clean()
-    conn_graph = signals.detailed_connection_graph()
-    staged = {r.name: r.args_show()
-              for r in resource.load_all().values()}
-    commited = data.CD()
-    return _stage_changes(staged, conn_graph, commited, log)
+
+    names = _candidates(full)
+    # unmarked before reading, so a resource written concurrently is
+    # marked again by the write and isn't lost for the next staging
+    resource.unmark_dirty(names)
+    try:
+        resources = resource.load_many(names)
+        staged = {name: r.args_show() for name, r in resources.items()}
+
+        conn_graph = _staged_graph(resources)
+        # removed resources are staged too
+        conn_graph.add_nodes_from(names)
+
+        commited = data.CD()
+        _stage_changes(staged, conn_graph, commited, log)
+    except Exception:
+        resource.mark_dirty(names)
+        raise
+
+    # resources without diff are the same as commited
+    resource.mark_dirty(set(item.res for item in log.collection()))
+    return log
 
 
-def send_to_orchestration():
+def send_to_orchestration(full=False):
     dg = nx.MultiDiGraph()
-    staged = {r.name: r.args_show()
-              for r in resource.load_all().values()}
+    staged = {name: r.args_show()
+              for name, r in resource.load_many(_candidates(full)).items()}
     commited = data.CD()
     events = {}
     changed_nodes = []
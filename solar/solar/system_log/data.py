@@ -12,6 +12,9 @@ from enum import Enum
 
 db = get_db()
 
+# paths of data already converted to hashes by this process
+_upgraded = set()
+
 
 STATES = Enum('States', 'error inprogress pending success')
 
@@ -106,6 +109,11 @@ class Log(object):
     def append(self, logitem):
         self.ordered_log.add([(logitem.log_action, logitem.to_dict())])
 
+    def extend(self, logitems, pipe=None):
+        self.ordered_log.add(
+            [(item.log_action, item.to_dict()) for item in logitems],
+            pipe=pipe)
+
     def pop(self, uid):
         item = self.get(uid)
         if not item:
@@ -113,8 +121,12 @@ class Log(object):
         self.ordered_log.rem([uid])
         return item
 
-    def update(self, logitem):
-        self.ordered_log.update(logitem.log_action, logitem.to_dict())
+    def rem(self, uids, pipe=None):
+        self.ordered_log.rem(uids, pipe=pipe)
+
+    def update(self, logitem, pipe=None):
+        self.ordered_log.update(
+            logitem.log_action, logitem.to_dict(), pipe=pipe)
 
     def clean(self):
         self.ordered_log.clean()
@@ -125,6 +137,12 @@ class Log(object):
             return LogItem.from_dict(**item)
         return None
 
+    def get_many(self, keys):
+        return [
+            LogItem.from_dict(**item) if item else None
+            for item in self.ordered_log.get_many(keys)
+        ]
+
     def collection(self, n=0):
         for item in self.ordered_log.reverse(n=n):
             yield LogItem.from_dict(**item)
@@ -138,30 +156,52 @@ class Log(object):
 
 
 class Data(collections.MutableMapping):
+    """Commited data with one hash field per key.
+
+    Values are loaded lazily, per key, and every write touches only
+    the changed key.
+    """
+
+    _missing = object()
 
     def __init__(self, path):
         self.path = path
         self.store = {}
-        r = db.read(path, collection=db.COLLECTIONS.state_data)
-        if r:
-            self.store = r or self.store
+        self._hash = db.get_hash(path, collection=db.COLLECTIONS.state_data)
+        if path not in _upgraded:
+            self._hash.upgrade()
+            _upgraded.add(path)
 
     def __getitem__(self, key):
+        if key not in self.store:
+            value = self._hash.get(key, self._missing)
+            if value is self._missing:
+                raise KeyError(key)
+            self.store[key] = value
         return self.store[key]
 
     def __setitem__(self, key, value):
         self.store[key] = value
-        db.save(self.path, self.store, collection=db.COLLECTIONS.state_data)
+        self._hash.set(key, value)
 
     def __delitem__(self, key):
-        self.store.pop(key)
-        db.save(self.path, self.store, collection=db.COLLECTIONS.state_data)
+        if key not in self:
+            raise KeyError(key)
+        self.store.pop(key, None)
+        self._hash.delete(key)
 
     def __iter__(self):
-        return iter(self.store)
+        return iter(self._hash.keys())
 
     def __len__(self):
-        return len(self.store)
+        return len(self._hash)
+
+    def update_many(self, items, pipe=None):
+        """Set several keys with a single write."""
+        items = list(items)
+        self.store.update(items)
+        self._hash.set_many(items, pipe=pipe)
 
     def clean(self):
-        db.save(self.path, {}, collection=db.COLLECTIONS.state_data)
+        self.store = {}
+        self._hash.clean()
@@ -1,24 +1,99 @@
-
-
 from solar.system_log import data
 from dictdiffer import patch
 
 
+# events reported by finished tasks, applied in batches by process_events
+PENDING_EVENTS = 'pending_events'
+# set while some worker drains PENDING_EVENTS
+DRAINING = 'pending_events_draining'
+DRAINING_TTL = 300
+
+
 def set_error(log_action, *args, **kwargs):
-    sl = data.SL()
-    item = sl.get(log_action)
-    if item:
-        item.state = data.STATES.error
-        sl.update(item)
+    apply_events([('error', log_action)])
 
 
 def move_to_commited(log_action, *args, **kwargs):
+    apply_events([('commit', log_action)])
+
+
+def apply_events(events):
+    """Apply ('commit'|'error', log_action) events in one transaction.
+
+    Items are appended to commit log in order of events.
+    """
     sl = data.SL()
-    item = sl.pop(log_action)
-    if item:
-        commited = data.CD()
-        staged_data = patch(item.diff, commited.get(item.log_action, {}))
-        cl = data.CL()
+    items = sl.get_many([log_action for _, log_action in events])
+
+    commited = data.CD()
+    staged = {}
+    to_commit = []
+    errors = []
+
+    for (event, log_action), item in zip(events, items):
+        if not item:
+            continue
+        if event == 'error':
+            item.state = data.STATES.error
+            errors.append(item)
+            continue
+        if item.res not in staged:
+            staged[item.res] = commited.get(item.res, {})
+        staged[item.res] = patch(item.diff, staged[item.res])
         item.state = data.STATES.success
-        cl.append(item)
-        commited[item.res] = staged_data
+        to_commit.append(item)
+
+    if not to_commit and not errors:
+        return
+
+    cl = data.CL()
+    with data.db.pipeline() as pipe:
+        for item in errors:
+            sl.update(item, pipe=pipe)
+        sl.rem([item.log_action for item in to_commit], pipe=pipe)
+        cl.extend(to_commit, pipe=pipe)
+        commited.update_many(staged.items(), pipe=pipe)
+        pipe.execute()
+
+
+def add_event(event, log_action):
+    """Queue event, returns True if drain of the queue should be started."""
+    data.db.push(
+        PENDING_EVENTS, [(event, log_action)],
+        collection=data.db.COLLECTIONS.state_log)
+    return data.db.set_flag(
+        DRAINING, DRAINING_TTL, collection=data.db.COLLECTIONS.state_log)
+
+
+def process_events(count=100):
+    """Apply queued events in chunks of `count`, until queue is empty.
+
+    Only the worker that set the DRAINING flag processes the queue, so
+    events are applied in the same order they were reported. Events are
+    removed from the queue only after they were applied, so if applying
+    fails they are retried by the next drain.
+    """
+    state_log = data.db.COLLECTIONS.state_log
+    draining = True
+    try:
+        while True:
+            events = data.db.list_head(
+                PENDING_EVENTS, count, collection=state_log)
+            if events:
+                apply_events([tuple(e) for e in events])
+                data.db.trim_head(
+                    PENDING_EVENTS, len(events), collection=state_log)
+                continue
+
+            data.db.delete(DRAINING, collection=state_log)
+            draining = False
+            # event could be queued after last read, while flag was still set
+            if not data.db.list_length(PENDING_EVENTS, collection=state_log):
+                return
+            if not data.db.set_flag(
+                    DRAINING, DRAINING_TTL, collection=state_log):
+                return
+            draining = True
+    finally:
+        if draining:
+            data.db.delete(DRAINING, collection=state_log)
@@ -1,9 +1,10 @@
 
-
 from solar.orchestration.runner import app
 from solar.system_log.operations import set_error, move_to_commited
+from solar.system_log import operations
 
-__all__ = ['error_logitem', 'commit_logitem']
+__all__ = ['error_logitem', 'commit_logitem', 'process_logitems',
+           'report_logitem']
 
 
 @app.task(name='error_logitem')
@@ -14,3 +15,18 @@ def error_logitem(task_uuid):
 @app.task(name='commit_logitem')
 def commit_logitem(task_uuid):
     return move_to_commited(task_uuid.rsplit(':', 1)[-1])
+
+
+@app.task(name='process_logitems')
+def process_logitems():
+    return operations.process_events()
+
+
+def report_logitem(task_uuid, event):
+    """Queue 'commit' or 'error' event of finished task.
+
+    Events are applied in batches, process_logitems is sent only when
+    nobody is draining the queue already.
+    """
+    if operations.add_event(event, task_uuid.rsplit(':', 1)[-1]):
+        process_logitems.apply_async(queue='system_log')
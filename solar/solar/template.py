@@ -112,7 +112,7 @@ class ResourceListTemplate(BaseTemplate):
             argument
         """
 
-        created_resources = []
+        items = []
 
         resource_path_name = os.path.split(resource_path)[-1]
 
@@ -125,11 +125,14 @@ class ResourceListTemplate(BaseTemplate):
 
             args_fmt = cls.args_fmt(args, kwargs)
 
-            r = vr.create('{name}'.format(**kwargs),
-                          resource_path,
-                          args_fmt)[0]
+            items.append(('{name}'.format(**kwargs), args_fmt))
 
-            created_resources.append(r)
+        if vr.is_virtual(resource_path):
+            created_resources = [
+                vr.create(name, resource_path, args_fmt)[0]
+                for name, args_fmt in items]
+        else:
+            created_resources = vr.create_bulk(resource_path, items)
 
         return ResourceListTemplate(created_resources)
 
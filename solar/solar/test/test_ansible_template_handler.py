@@ -0,0 +1,52 @@
+import mock
+
+from solar.core import process
+from solar.core.handlers import ansible_template
+
+
+RECAP = process.Result('''
+PLAY RECAP ********************************************************************
+10.0.0.3                   : ok=2    changed=1    unreachable=0    failed=0
+10.0.0.4                   : ok=1    changed=0    unreachable=0    failed=1
+''', '', 0, started_at=10, finished_at=14)
+
+
+def _resource(name, ip, hosts):
+    res = mock.Mock()
+    res.name = name
+    res.args = {
+        'ip': mock.Mock(value=ip),
+        'ssh_user': mock.Mock(value='vagrant'),
+        'ssh_key': mock.Mock(value='/key'),
+    }
+    res.playbook = '- hosts: [{}]\n  tasks:\n    - shell: echo {}\n'.format(
+        ip, hosts)
+    return res
+
+
+@mock.patch.object(
+    process, 'run_many', side_effect=lambda processes: [RECAP] * len(processes))
+def test_action_many_runs_same_playbook_once(run_many):
+    items = [
+        (_resource('hosts1', '10.0.0.3', 'a'), 'run'),
+        (_resource('hosts2', '10.0.0.4', 'a'), 'run'),
+        (_resource('hosts3', '10.0.0.3', 'a'), 'run'),
+    ]
+    handler = ansible_template.AnsibleTemplate([r for r, _ in items])
+
+    with mock.patch.object(
+            handler, '_render_action',
+            side_effect=lambda resource, action: resource.playbook):
+        with handler:
+            errors = handler.action_many(items)
+
+    # hosts1 and hosts2 together, hosts3 is on the same host as hosts1
+    processes = run_many.call_args[0][0]
+    assert run_many.call_count == 1
+    assert len(processes) == 2
+    assert processes[0].args[-2:] == ['--forks', '2']
+    assert errors[0] is None
+    assert 'hosts2' in str(errors[1])
+    assert errors[2] is None
+    # time of the bulk run is shared by its resources
+    assert handler.timings == [(10, 12, False), (12, 14, False), (10, 14, True)]
@@ -0,0 +1,85 @@
+import fakeredis
+from mock import Mock, patch
+import networkx as nx
+from pytest import fixture, raises
+
+from solar.orchestration import graph
+from solar.orchestration import tasks
+
+
+@fixture(autouse=True)
+def redis_client(request):
+    patcher = patch.object(graph, 'r', fakeredis.FakeStrictRedis())
+    client = patcher.start()
+    request.addfinalizer(patcher.stop)
+    request.addfinalizer(client.flushdb)
+    request.addfinalizer(graph._structures.clear)
+    return client
+
+
+@fixture
+def plan():
+    dg = nx.MultiDiGraph()
+    for t in ('t1', 't2', 't3'):
+        dg.add_node(t, status='PENDING', errmsg=None, target='1')
+    dg.graph['name'] = 'test'
+    return graph.create_plan_from_graph(dg)
+
+
+@patch.object(tasks, 'report_logitem')
+@patch.object(tasks, 'schedule_next_many')
+@patch.object(tasks, 'run_task', return_value=('SUCCESS', None))
+@patch.object(tasks, '_resource_actions', side_effect=Exception('lost'))
+def test_batch_failure_reported_for_all_tasks(
+        resource_actions, run_task, schedule_next_many, report_logitem):
+    batch = [('plan:t1', 'solar_resource', ['node1', 'run']),
+             ('plan:t2', 'echo', ['2'])]
+
+    with raises(Exception):
+        tasks.batch.run(batch)
+
+    results = schedule_next_many.apply_async.call_args[1]['args'][0]
+    assert [(t, s) for t, s, _ in results] == [
+        ('plan:t1', 'ERROR'), ('plan:t2', 'ERROR')]
+    assert report_logitem.call_count == 2
+
+
+@patch.object(tasks, 'report_logitem')
+@patch.object(tasks.actions, 'timed_resource_actions')
+@patch.object(tasks.resource, 'load_many')
+def test_batched_tasks_timed_separately(
+        load_many, resource_actions, report_logitem, plan):
+    load_many.return_value = {'node1': Mock(), 'node2': Mock()}
+    resource_actions.return_value = [
+        (None, (10, 13, True)), (Exception('failed'), (13, 14, True))]
+    batch = [('{}:t1'.format(plan), 'solar_resource', ['node1', 'run']),
+             ('{}:t2'.format(plan), 'solar_resource', ['node2', 'run']),
+             ('{}:t3'.format(plan), 'solar_resource', ['missing', 'run'])]
+
+    results = tasks._resource_actions(batch)
+
+    assert [s for _, s, _ in results] == ['SUCCESS', 'ERROR', 'ERROR']
+    dg = graph.get_graph(plan)
+    assert (dg.node['t1']['started_at'], dg.node['t1']['finished_at']) == (
+        10, 13)
+    assert (dg.node['t2']['started_at'], dg.node['t2']['finished_at']) == (
+        13, 14)
+    assert dg.node['t3']['finished_at'] == dg.node['t3']['started_at']
+
+
+@patch.object(tasks, 'report_logitem')
+@patch.object(tasks.actions, 'timed_resource_actions')
+@patch.object(tasks.resource, 'load_many')
+def test_only_own_durations_remembered(
+        load_many, resource_actions, report_logitem, plan):
+    load_many.return_value = {'node1': Mock(), 'node2': Mock()}
+    # t2 and t3 were applied by one run, each got a half of its time
+    resource_actions.return_value = [
+        (None, (10, 11, True)), (None, (11, 15, False)),
+        (None, (15, 19, False))]
+    batch = [('{}:{}'.format(plan, t), 'solar_resource', [n, 'run'])
+             for t, n in (('t1', 'node1'), ('t2', 'node2'), ('t3', 'node2'))]
+
+    tasks._resource_actions(batch)
+
+    assert graph.get_durations() == {'t1': 1}
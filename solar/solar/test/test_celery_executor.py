@@ -20,3 +20,20 @@ def test_celery_executor(mapp, dg):
     """
     assert executor.celery_executor(dg, ['t1'])
     assert dg.node['t1']['status'] == 'INPROGRESS'
+
+
+@patch.object(executor, 'app')
+def test_tasks_with_same_target_batched(mapp, dg):
+    dg.node['t1']['target'] = 'node1'
+    dg.add_node('t2', args=['t'], status='PENDING', type='echo',
+                target='node1')
+    dg.add_node('t3', args=['t'], status='PENDING', type='echo',
+                target='node2')
+
+    executor.celery_executor(dg, ['t1', 't2', 't3'])
+
+    mapp.tasks['batch'].subtask.assert_any_call(
+        [[('some_string:t1', 'echo', ['t']),
+          ('some_string:t2', 'echo', ['t'])]],
+        time_limit=None, soft_time_limit=None)
+    assert dg.node['t2']['status'] == 'INPROGRESS'
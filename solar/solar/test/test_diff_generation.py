@@ -1,10 +1,15 @@
 
+import mock
 from pytest import fixture
 from dictdiffer import revert, patch
 import networkx as nx
 
 from solar.system_log import change
+from solar.system_log import operations
+from solar.core import resource
+from solar.core import signals
 from solar.core.resource import wrap_resource
+from solar.test import base
 
 
 @fixture
@@ -106,3 +111,61 @@ def test_stage_changes(resources, conn_graph):
 
 def test_resource_fixture(staged):
     res = wrap_resource(staged)
+
+
+class TestIncrementalStaging(base.BaseResourceTest):
+
+    def test_only_dirty_resources_are_staged(self):
+        sample_meta_dir = self.make_resource_meta("""
+id: sample
+handler: ansible
+version: 1.0.0
+input:
+  ip:
+    schema: str
+    value:
+        """)
+        node = self.create_resource('node', sample_meta_dir, {'ip': '10.0.0.1'})
+        service = self.create_resource('service', sample_meta_dir, {'ip': None})
+        signals.connect(node, service)
+
+        log = change.stage_changes()
+        assert [l.res for l in log.reverse()] == ['node', 'service']
+
+        for item in log.reverse():
+            operations.move_to_commited(item.log_action)
+        assert list(change.stage_changes()) == []
+        assert resource.dirty_resources() == []
+
+        service.update({'ip': '10.0.0.2'})
+        assert resource.dirty_resources() == ['service']
+        assert [l.res for l in change.stage_changes()] == ['service']
+
+    def test_concurrent_write_stays_dirty(self):
+        sample_meta_dir = self.make_resource_meta("""
+id: sample
+handler: ansible
+version: 1.0.0
+input:
+  ip:
+    schema: str
+    value:
+        """)
+        node = self.create_resource('node', sample_meta_dir, {'ip': '10.0.0.1'})
+        for item in change.stage_changes().reverse():
+            operations.move_to_commited(item.log_action)
+        node.update({'ip': '10.0.0.1'})
+        assert resource.dirty_resources() == ['node']
+
+        stage = change._stage_changes
+
+        def write_while_staging(*args):
+            # another process writes after resources were read
+            node.update({'ip': '10.0.0.2'})
+            return stage(*args)
+
+        with mock.patch.object(change, '_stage_changes', write_while_staging):
+            assert list(change.stage_changes()) == []
+
+        assert resource.dirty_resources() == ['node']
+        assert [l.res for l in change.stage_changes()] == ['node']
@@ -0,0 +1,157 @@
+import os
+import time
+
+import fakeredis
+import networkx as nx
+from pytest import fixture
+from mock import patch
+
+from solar.orchestration import graph
+
+
+@fixture
+def plan_path():
+    return os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        'orch_fixtures',
+        'simple.yaml')
+
+
+@fixture(autouse=True)
+def redis_client(request):
+    patcher = patch.object(graph, 'r', fakeredis.FakeStrictRedis())
+    client = patcher.start()
+    request.addfinalizer(patcher.stop)
+    request.addfinalizer(client.flushdb)
+    request.addfinalizer(graph._structures.clear)
+    return client
+
+
+def test_task_status_is_updated_in_place(plan_path, redis_client):
+    with open(plan_path) as f:
+        uid = graph.create_plan(f.read())
+    nodes = redis_client.get('{}:nodes'.format(uid))
+
+    graph.update_task(uid, 'echo_stuff', status='SUCCESS')
+    graph.update_task(uid, 'just_fail', status='ERROR', errmsg='message')
+
+    # static part of the plan is not rewritten
+    assert redis_client.get('{}:nodes'.format(uid)) == nodes
+
+    dg = graph.get_graph(uid)
+    assert dg.node['echo_stuff']['status'] == 'SUCCESS'
+    assert dg.node['echo_stuff']['errmsg'] is None
+    assert dg.node['just_fail']['status'] == 'ERROR'
+    assert dg.node['just_fail']['errmsg'] == 'message'
+
+    graph.reset(uid, ['ERROR'])
+    dg = graph.get_graph(uid)
+    assert dg.node['echo_stuff']['status'] == 'SUCCESS'
+    assert dg.node['just_fail']['status'] == 'PENDING'
+
+
+def test_structure_reloaded_after_update(plan_path):
+    with open(plan_path) as f:
+        plan = f.read()
+    uid = graph.create_plan(plan)
+    graph.update_task(uid, 'echo_stuff', status='SUCCESS')
+
+    assert graph.get_structure(uid) is graph.get_structure(uid)
+
+    structure = graph.get_structure(uid)
+    graph.update_plan(uid, plan)
+
+    assert graph.get_structure(uid) is not structure
+    # statuses are preserved by update
+    assert graph.get_graph(uid).node['echo_stuff']['status'] == 'SUCCESS'
+
+
+@patch.object(graph, 'MAX_STRUCTURES', 2)
+def test_least_recently_used_structures_evicted(plan_path):
+    with open(plan_path) as f:
+        plan = f.read()
+    uids = [graph.create_plan(plan) for _ in range(3)]
+
+    for uid in uids:
+        graph.get_structure(uid)
+    graph.get_structure(uids[1])
+
+    assert list(graph._structures) == [uids[2], uids[1]]
+
+
+@fixture
+def plan():
+    dg = nx.MultiDiGraph()
+    for t in ('t1', 't2', 't3'):
+        dg.add_node(t, status='PENDING', errmsg=None, target='1')
+    dg.add_edge('t1', 't3')
+    dg.add_edge('t2', 't3')
+    dg.graph['name'] = 'test'
+    return dg
+
+
+def select_all(dg, ready, inprogress):
+    return ready
+
+
+def test_ready_set_updated_on_transitions(plan):
+    dg = plan
+    uid = graph.create_plan_from_graph(dg)
+
+    assert graph.get_ready(uid) == {'t1', 't2'}
+
+    graph.start_tasks(uid, select_all)
+    assert graph.get_ready(uid) == set()
+    assert graph.get_inprogress(uid, dg).target('1') == 2
+
+    graph.finish_task(uid, 't1', 'SUCCESS')
+    assert graph.get_ready(uid) == set()
+    assert graph.get_inprogress(uid, dg).target('1') == 1
+
+    graph.finish_task(uid, 't2', 'ERROR', errmsg='failed')
+    assert graph.get_ready(uid) == {'t3'}
+    assert len(graph.get_inprogress(uid, dg)) == 0
+
+    graph.reset(uid, ['ERROR'])
+    assert graph.get_ready(uid) == {'t2'}
+
+
+def test_start_tasks_retried_on_conflict(plan, redis_client):
+    uid = graph.create_plan_from_graph(plan)
+    calls = []
+
+    def select(dg, ready, inprogress):
+        calls.append(ready)
+        if len(calls) == 1:
+            # another scheduler claims t1 between read and write
+            graph.start_tasks(uid, lambda dg, ready, inprogress: ['t1'])
+        return ready
+
+    _, started = graph.start_tasks(uid, select)
+
+    assert calls == [['t1', 't2'], ['t2']]
+    assert started == ['t2']
+    assert len(graph.get_inprogress(uid, plan)) == 2
+
+
+def test_finish_task_reported_once(plan):
+    uid = graph.create_plan_from_graph(plan)
+    graph.start_tasks(uid, select_all)
+
+    assert graph.finish_task(uid, 't1', 'SUCCESS')
+    assert not graph.finish_task(uid, 't1', 'SUCCESS')
+    assert len(graph.get_inprogress(uid, plan)) == 1
+
+
+def test_durations_used_for_priorities_of_new_plans(plan):
+    uid = graph.create_plan_from_graph(plan)
+    graph.update_tasks(uid, {'t1': {'started_at': time.time()},
+                             't2': {'started_at': 0}})
+    graph.set_finished(uid, ['t1', 't2', 't3'])
+
+    assert graph.get_graph(uid).node['t2']['finished_at'] > 0
+    assert sorted(graph.get_durations()) == ['t1', 't2']
+
+    uid = graph.create_plan_from_graph(plan)
+    dg = graph.get_graph(uid)
+    assert dg.node['t2']['priority'] > dg.node['t1']['priority']
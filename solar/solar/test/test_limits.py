@@ -48,3 +48,39 @@ def test_filtering_chain(target_dg):
 
     chain = limits.get_default_chain(target_dg, [], ['t1', 't2'])
     assert list(chain) == ['t1']
+
+
+def test_inprogress_counters(dg):
+    inprogress = limits.InProgress(dg, ['t1', 't2'])
+    assert len(inprogress) == 2
+    assert inprogress.target('1') == 2
+    assert inprogress.type('node') == 2
+
+    inprogress.remove('t1')
+    assert limits.type_based_rule(dg, inprogress, 't3') == True
+    assert limits.target_based_rule(dg, inprogress, 't3') == False
+
+
+def test_priorities_by_longest_remaining_path():
+    dg = nx.DiGraph()
+    dg.add_path(['keystone', 'glance', 'nova'])
+    dg.add_node('hosts')
+    dg.add_edge('keystone', 'hosts_check')
+
+    prio = limits.priorities(dg, {'keystone': 10, 'glance': 5, 'nova': 20})
+
+    assert prio['nova'] == 20
+    assert prio['keystone'] == 35
+    # tasks without history get the average duration
+    assert prio['hosts'] == 35 / 3.0
+    assert limits.priorities(dg, {})['keystone'] == 3
+
+
+def test_default_chain_starts_high_priority_first():
+    dg = nx.DiGraph()
+    dg.add_node('t1', status='PENDING', target='1', priority=1)
+    dg.add_node('t2', status='PENDING', target='1', priority=10)
+    dg.add_node('t3', status='PENDING', target='2')
+
+    assert list(limits.get_default_chain(dg, [], ['t1', 't2', 't3'])) == [
+        't2', 't3']
@@ -0,0 +1,81 @@
+from multiprocessing.pool import ThreadPool
+
+import fakeredis
+import networkx as nx
+from pytest import fixture
+from mock import patch
+
+from solar.orchestration import graph
+from solar.orchestration import local
+
+
+@fixture(autouse=True)
+def redis_client(request):
+    patcher = patch.object(graph, 'r', fakeredis.FakeStrictRedis())
+    client = patcher.start()
+    request.addfinalizer(patcher.stop)
+    request.addfinalizer(client.flushdb)
+    request.addfinalizer(graph._structures.clear)
+    return client
+
+
+@fixture
+def threads(request):
+    # fakeredis data written by forked workers is not seen by the test
+    patcher = patch.object(local, 'Pool', ThreadPool)
+    patcher.start()
+    request.addfinalizer(patcher.stop)
+
+
+@fixture
+def plan():
+    dg = nx.MultiDiGraph()
+    dg.add_node('t1', status='PENDING', errmsg=None, type='echo', args=['1'])
+    dg.add_node('t2', status='PENDING', errmsg=None, type='error',
+                args=['failed'])
+    dg.add_node('t3', status='PENDING', errmsg=None, type='echo', args=['3'])
+    dg.add_node('t4', status='PENDING', errmsg=None, type='echo', args=['4'])
+    dg.add_edge('t1', 't3')
+    dg.add_edge('t2', 't4')
+    dg.graph['name'] = 'test'
+    return dg
+
+
+def test_plan_executed_locally(plan, threads):
+    uid = graph.create_plan_from_graph(plan)
+
+    local.run(uid, workers=2)
+
+    dg = graph.get_graph(uid)
+    assert dg.node['t1']['status'] == 'SUCCESS'
+    assert dg.node['t2']['status'] == 'ERROR'
+    assert dg.node['t3']['status'] == 'SUCCESS'
+    assert dg.node['t4']['status'] == 'SKIPPED'
+    assert dg.node['t1']['finished_at'] >= dg.node['t1']['started_at']
+    assert dg.node['t3']['started_at'] >= dg.node['t3']['enqueued_at']
+    assert dg.node['t4']['started_at'] is None
+    assert graph.get_ready(uid) == set()
+    assert len(graph.get_inprogress(uid, dg)) == 0
+
+
+def test_unexpected_errors_reported(plan):
+    plan.node['t1']['type'] = 'not_existing'
+    uid = graph.create_plan_from_graph(plan)
+
+    with patch.object(graph, 'set_finished', side_effect=Exception('db')):
+        dg = local.run(uid, workers=2)
+
+    assert dg.node['t1']['status'] == 'ERROR'
+    assert 'not_existing' in dg.node['t1']['errmsg']
+    assert dg.node['t2']['status'] == 'ERROR'
+    assert dg.node['t2']['errmsg'] == 'db'
+
+
+def test_tasks_executed_by_processes(plan):
+    uid = graph.create_plan_from_graph(plan)
+
+    dg = local.run(uid, workers=2)
+
+    assert [dg.node[t]['status'] for t in ('t1', 't2', 't3', 't4')] == [
+        'SUCCESS', 'ERROR', 'SUCCESS', 'SKIPPED']
+    assert dg.node['t2']['errmsg'] == 'message'
@@ -0,0 +1,33 @@
+from click.testing import CliRunner
+import fakeredis
+import networkx as nx
+from pytest import fixture
+from mock import patch
+
+from solar.cli.orch import orchestration
+from solar.orchestration import graph
+
+
+@fixture(autouse=True)
+def redis_client(request):
+    patcher = patch.object(graph, 'r', fakeredis.FakeStrictRedis())
+    client = patcher.start()
+    request.addfinalizer(patcher.stop)
+    request.addfinalizer(client.flushdb)
+    request.addfinalizer(graph._structures.clear)
+    return client
+
+
+def test_run_local():
+    dg = nx.MultiDiGraph()
+    dg.add_node('t1', status='PENDING', errmsg=None, type='echo', args=['1'])
+    dg.add_node('t2', status='PENDING', errmsg=None, type='echo', args=['2'])
+    dg.add_edge('t1', 't2')
+    dg.graph['name'] = 'test'
+    uid = graph.create_plan_from_graph(dg)
+
+    result = CliRunner().invoke(orchestration, ['run', uid, '--local', '-j', '2'])
+
+    assert result.exit_code == 0, result.output
+    assert 't1 -> SUCCESS' in result.output
+    assert 't2 -> SUCCESS' in result.output
@@ -0,0 +1,52 @@
+from pytest import raises
+
+from solar.core import process
+
+
+def test_processes_run_concurrently():
+    chunks = []
+    results = process.run_many([
+        process.Process(['sh', '-c', 'echo out; echo err >&2'],
+                        on_output=lambda s, c: chunks.append((s, c))),
+        process.Process(['sh', '-c', 'exit 3']),
+        process.Process(['sleep', '5'], timeout=0.2),
+    ])
+
+    assert results[0] == 'out\n'
+    assert results[0].stderr == 'err\n'
+    assert results[0].succeeded
+    assert sorted(chunks) == [('stderr', 'err\n'), ('stdout', 'out\n')]
+    assert results[1].return_code == 3
+    assert results[1].failed
+    assert results[2].timed_out
+    assert results[2].failed
+    assert results[2].finished_at - results[2].started_at < 5
+
+
+def test_env_added():
+    result = process.run(['sh', '-c', 'echo $SOLAR_TEST'],
+                         env={'SOLAR_TEST': 'value'})
+    assert result == 'value\n'
+
+
+def test_only_running_processes_killed():
+    results = process.run_many([
+        process.Process(['true'], timeout=0.2),
+        process.Process(['sleep', '5'], timeout=0.5),
+        process.Process(['sleep', '1']),
+    ])
+
+    assert results[0].succeeded
+    assert not results[0].timed_out
+    assert results[1].timed_out
+    assert results[2].succeeded
+    assert not results[2].timed_out
+
+
+def test_started_processes_killed_if_start_failed():
+    sleeping = process.Process(['sleep', '5'])
+    with raises(OSError):
+        process.run_many([sleeping, process.Process(['/not/existing'])])
+
+    assert sleeping.timed_out is False
+    assert sleeping.popen.returncode is not None
@@ -0,0 +1,81 @@
+import os
+
+import mock
+from pytest import fixture
+
+from solar.core.handlers import puppet
+
+
+@fixture
+def resource():
+    res = mock.Mock()
+    res.metadata = {'puppet_module': 'keystone'}
+    res.args = {
+        'ip': mock.Mock(value='10.0.0.3'),
+        'git': mock.Mock(value={'repository': 'repo', 'branch': 'master'}),
+    }
+    return res
+
+
+@mock.patch.object(puppet.LibrarianPuppet, '_scp_command')
+@mock.patch.object(puppet.LibrarianPuppet, '_ssh_command', return_value='')
+def test_librarian_install_cached_per_node(ssh, scp, resource):
+    puppet.LibrarianPuppet(resource).install()
+    calls = ssh.call_count
+
+    puppet.LibrarianPuppet(resource).install()
+    assert ssh.call_count == calls
+
+    resource.args['git'].value = {'repository': 'repo', 'branch': 'stable'}
+    puppet.LibrarianPuppet(resource).install()
+    assert ssh.call_count == calls * 2
+
+    puppet.invalidate_modules_cache('10.0.0.3')
+    puppet.LibrarianPuppet(resource).install()
+    assert ssh.call_count == calls * 3
+
+
+def _resource(name, ip):
+    res = mock.Mock()
+    res.name = name
+    res.args = {'ip': mock.Mock(value=ip), 'ssh_user': mock.Mock(value='vagrant')}
+    return res
+
+
+@mock.patch.object(puppet.Puppet, 'upload_manifests')
+@mock.patch.object(puppet.Puppet, '_scp_command')
+@mock.patch.object(puppet.Puppet, '_ssh_command')
+def test_action_many_one_session_per_node(ssh, scp, upload, tmpdir):
+    outputs = {
+        '10.0.0.3': 'SOLAR-EXIT-CODE 0 2 100.0 103.5\nnotice: done\n'
+                    'SOLAR-EXIT-CODE 1 1 103.5 104.0\n',
+        '10.0.0.4': 'SOLAR-EXIT-CODE 0 0\n',
+    }
+    ssh.side_effect = lambda res, *args, **kwargs: outputs[res.args['ip'].value]
+    items = [
+        (_resource('keystone', '10.0.0.3'), 'run'),
+        (_resource('glance', '10.0.0.4'), 'run'),
+        (_resource('nova', '10.0.0.3'), 'run'),
+    ]
+    handler = puppet.Puppet([r for r, _ in items])
+
+    with mock.patch.object(
+            handler, '_compile_action_file',
+            return_value=str(tmpdir.join('action.pp').ensure())), \
+            mock.patch.object(puppet.time, 'time', return_value=1000.0):
+        with handler:
+            errors = handler.action_many(items)
+
+    assert ssh.call_count == 2
+    assert scp.call_count == 2
+    # uploaded manifests are removed, locally and on the node
+    batch_dir = scp.call_args[0][1]
+    assert not os.path.exists(batch_dir)
+    assert 'rm -rf /tmp/{}'.format(os.path.basename(batch_dir)) in \
+        ssh.call_args[0][3]
+    assert errors[0] is None
+    assert errors[1] is None
+    assert 'nova' in str(errors[2])
+    # node time is aligned by the start of the first manifest
+    assert handler.timings == [
+        (1000.0, 1003.5, True), (1000.0, 1000.0, True), (1003.5, 1004.0, True)]
@@ -0,0 +1,78 @@
+from pytest import fixture
+
+from solar.interfaces import db as db_module
+from solar.interfaces.db import codecs
+
+
+@fixture
+def db():
+    return db_module.get_db()
+
+
+def test_get_list_streams_all_values(db):
+    db.save_list(
+        [(str(i), {'id': i}) for i in range(25)],
+        collection=db.COLLECTIONS.state_data)
+    db.save('other', {'id': 'other'}, collection=db.COLLECTIONS.events)
+
+    values = list(db.get_list(collection=db.COLLECTIONS.state_data, count=7))
+
+    assert sorted(v['id'] for v in values) == range(25)
+
+
+def test_clear_collection(db):
+    db.save_list(
+        [(str(i), {'id': i}) for i in range(25)],
+        collection=db.COLLECTIONS.state_data)
+    db.save('other', {'id': 'other'}, collection=db.COLLECTIONS.events)
+
+    db.clear_collection(collection=db.COLLECTIONS.state_data, count=7)
+
+    assert list(db.get_list(collection=db.COLLECTIONS.state_data)) == []
+    assert db.read('other', collection=db.COLLECTIONS.events) == {'id': 'other'}
+
+
+def test_hash_upgrade_from_string(db):
+    db.save('commited', {'a': {'ip': 1}, 'b': {}},
+            collection=db.COLLECTIONS.state_data)
+    h = db.get_hash('commited', collection=db.COLLECTIONS.state_data)
+
+    h.upgrade()
+
+    assert sorted(h.keys()) == ['a', 'b']
+    assert h.get('a') == {'ip': 1}
+    assert h.get('missing', 'default') == 'default'
+
+
+def test_ordered_set_paging(db):
+    s = db.get_set('test_log')
+    s.add([(str(i), {'id': i}) for i in range(10)])
+    s.rem(['3'])
+
+    assert [v['id'] for v in s.list(n=3)] == [0, 1, 2]
+    assert [v['id'] for v in s.reverse(n=2)] == [9, 8]
+    assert [v['id'] for v in s.range(2, 5)] == [2, 4, 5]
+
+    items = list(s.iter_from(count=4))
+    assert [v['id'] for _, v in items] == [0, 1, 2, 4, 5, 6, 7, 8, 9]
+    cursor = items[4][0]
+    assert [v['id'] for _, v in s.iter_from(cursor)] == [6, 7, 8, 9]
+
+    s.clean()
+    assert s.list() == []
+
+
+def test_codecs(db):
+    db.save('res', {'ip': '10.0.0.2'}, collection=db.COLLECTIONS.resource)
+    db.save('data', {'ip': '10.0.0.2'}, collection=db.COLLECTIONS.state_data)
+
+    # resources stay json for hiera
+    assert db._r.get('resource:res') == '{"ip": "10.0.0.2"}'
+    assert db._r.get('state_data:data').startswith(codecs.MSGPACK.tag)
+    assert db.read('data', collection=db.COLLECTIONS.state_data) == {
+        'ip': '10.0.0.2'}
+
+    # data written before codecs were introduced
+    db._r.set('state_data:old', '{"ip": "10.0.0.3"}')
+    assert db.read('old', collection=db.COLLECTIONS.state_data) == {
+        'ip': '10.0.0.3'}
@@ -1,9 +1,13 @@
+import threading
 import unittest
 
 import base
+import mock
 
 from solar.core import resource
 from solar.core import signals
+from solar.core.resource import virtual_resource as vr
+from solar import template
 
 
 class TestResource(base.BaseResourceTest):
@@ -62,6 +66,176 @@ input:
         sample1.update({'value': 2})
         self.assertEqual(sample1.args['value'], sample2.args['value'])
 
+    def test_load_in_session(self):
+        sample_meta_dir = self.make_resource_meta("""
+id: sample
+handler: ansible
+version: 1.0.0
+input:
+  value:
+    schema: int
+    value: 0
+        """)
+        self.create_resource('sample1', sample_meta_dir, {'value': 1})
+        self.create_resource('sample2', sample_meta_dir, {})
+
+        with resource.session():
+            sample1 = resource.load('sample1')
+            sample2 = resource.load('sample2')
+            self.assertIs(resource.load('sample1'), sample1)
+
+            signals.connect(sample1, sample2)
+            sample1.update({'value': 2})
+            self.assertEqual(sample2.args['value'].value, 2)
+
+            resource.invalidate('sample1')
+            self.assertIsNot(resource.load('sample1'), sample1)
+
+            # raw writes are not lost behind the session's objects
+            sample2 = resource.load('sample2')
+            raw = resource.resource.read_raw('sample2')
+            raw['input']['value']['value'] = 3
+            resource.resource.save_raw_list([raw])
+            self.assertIsNot(resource.load('sample2'), sample2)
+            self.assertEqual(resource.load('sample2').args['value'].value, 3)
+
+        # writes went through to the DB
+        self.assertEqual(resource.load('sample2').args['value'].value, 3)
+        self.assertIsNot(resource.load('sample2'), resource.load('sample2'))
+
+    def test_metadata_shared_between_resources(self):
+        sample_meta_dir = self.make_resource_meta("""
+id: sample
+handler: ansible
+version: 1.0.0
+input:
+  value:
+    schema: int
+    value: 0
+        """)
+        self.create_resource('sample1', sample_meta_dir, {'value': 1})
+        self.create_resource('sample2', sample_meta_dir, {'value': 2})
+
+        db = resource.resource.db
+        self.assertEqual(
+            len(db.get_uids(collection=db.COLLECTIONS.resource_meta)), 1)
+
+        # hiera view of the resource
+        record = db.read('sample1', collection=db.COLLECTIONS.resource)
+        self.assertEqual(record['input'], {'value': {'value': 1}})
+        self.assertNotIn('handler', record)
+
+        sample2 = resource.load('sample2')
+        self.assertEqual(sample2.metadata['handler'], 'ansible')
+        self.assertEqual(sample2.metadata['input']['value']['schema'], 'int')
+        self.assertEqual(sample2.args['value'].value, 2)
+
+    def test_create_bulk(self):
+        sample_meta_dir = self.make_resource_meta("""
+id: sample
+handler: ansible
+version: 1.0.0
+input:
+  value:
+    schema: int
+    value: 0
+        """)
+
+        with mock.patch.object(
+                vr.utils, 'yaml_load', wraps=vr.utils.yaml_load) as yaml_load:
+            samples = template.ResourceListTemplate.create(
+                3, sample_meta_dir, {'value': 1})
+
+        self.assertEqual(yaml_load.call_count, 1)
+        self.assertEqual(
+            [r.name for r in samples.resources],
+            ['sample-0', 'sample-1', 'sample-2'])
+        self.assertEqual(resource.load('sample-2').args['value'].value, 1)
+
+    def test_load_all(self):
+        sample_meta_dir = self.make_resource_meta("""
+id: sample
+handler: ansible
+version: 1.0.0
+input:
+  value:
+    schema: int
+    value: 0
+        """)
+        self.create_resource('sample1', sample_meta_dir, {'value': 1})
+        self.create_resource('sample2', sample_meta_dir, {'value': 2})
+        resource.resource._meta_cache.clear()
+
+        resources = resource.load_all()
+
+        self.assertEqual(sorted(resources), ['sample1', 'sample2'])
+        self.assertEqual(resources['sample2'].args['value'].value, 2)
+
+    def test_missing_metadata_reported(self):
+        sample_meta_dir = self.make_resource_meta("""
+id: sample
+handler: ansible
+version: 1.0.0
+input:
+  value:
+    schema: int
+    value: 0
+        """)
+        self.create_resource('sample1', sample_meta_dir, {'value': 1})
+        db = resource.resource.db
+        db.clear_collection(collection=db.COLLECTIONS.resource_meta)
+        resource.resource._meta_cache.clear()
+
+        with self.assertRaisesRegexp(Exception, 'sample1'):
+            resource.load_all()
+
+    def test_session_reloads_resources_written_elsewhere(self):
+        sample_meta_dir = self.make_resource_meta("""
+id: sample
+handler: ansible
+version: 1.0.0
+input:
+  value:
+    schema: int
+    value: 0
+        """)
+        self.create_resource('sample1', sample_meta_dir, {'value': 1})
+
+        with resource.session():
+            sample1 = resource.load('sample1')
+            self.assertIs(resource.load('sample1'), sample1)
+
+            # other threads don't share the session, as other processes
+            writer = threading.Thread(
+                target=lambda: resource.load('sample1').update({'value': 5}))
+            writer.start()
+            writer.join()
+
+            reloaded = resource.load_many(['sample1'])['sample1']
+            self.assertIsNot(reloaded, sample1)
+            self.assertEqual(reloaded.args['value'].value, 5)
+            self.assertIs(resource.load('sample1'), reloaded)
+
+    def test_metadata_written_after_clear_in_session(self):
+        sample_meta_dir = self.make_resource_meta("""
+id: sample
+handler: ansible
+version: 1.0.0
+input:
+  value:
+    schema: int
+    value: 0
+        """)
+        db = resource.resource.db
+        with resource.session():
+            self.create_resource('sample1', sample_meta_dir, {'value': 1})
+            db.clear()
+            resource.invalidate()
+            self.create_resource('sample1', sample_meta_dir, {'value': 2})
+
+        resource.resource._meta_cache.clear()
+        self.assertEqual(resource.load('sample1').args['value'].value, 2)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,7 @@
 import unittest
 
+import mock
+
 import base
 
 from solar.core import signals as xs
@@ -173,6 +175,98 @@ input:
         with self.assertRaises(Exception):
             xs.connect(sample2, sample1)
 
+    def test_connections_index(self):
+        sample_meta_dir = self.make_resource_meta("""
+id: sample
+handler: ansible
+version: 1.0.0
+input:
+  ip:
+    schema: str
+    value:
+  port:
+    schema: int
+    value:
+        """)
+
+        sample1 = self.create_resource(
+            'sample1', sample_meta_dir, {'ip': '10.0.0.1', 'port': 22}
+        )
+        sample2 = self.create_resource(
+            'sample2', sample_meta_dir, {'ip': None, 'port': None}
+        )
+        xs.connect(sample1, sample2)
+
+        self.assertEqual(
+            xs.Connections.read_clients()['sample1'],
+            {'ip': [['sample2', 'ip']], 'port': [['sample2', 'port']]}
+        )
+        self.assertEqual(
+            xs.Connections.receivers('sample1', 'ip'), [['sample2', 'ip']])
+        self.assertEqual(
+            xs.Connections.emitter('sample2', 'port'), ['sample1', 'port'])
+
+        xs.disconnect(sample1, sample2)
+        self.assertEqual(xs.Connections.receivers('sample1', 'ip'), [])
+        self.assertEqual(xs.Connections.emitter('sample2', 'port'), None)
+        self.assertEqual(
+            xs.Connections.read_emitter_clients('sample1'),
+            {'ip': [], 'port': []}
+        )
+
+    def test_propagation_saves_each_resource_once(self):
+        sample_meta_dir = self.make_resource_meta("""
+id: sample
+handler: ansible
+version: 1.0.0
+input:
+  ip:
+    schema: str
+    value:
+        """)
+        list_meta_dir = self.make_resource_meta("""
+id: list-sample
+handler: ansible
+version: 1.0.0
+input:
+  ip:
+    schema: [str]
+    value: []
+        """)
+
+        node = self.create_resource('node', sample_meta_dir, {'ip': '10.0.0.1'})
+        services = [
+            self.create_resource(
+                'service{}'.format(i), sample_meta_dir, {'ip': None})
+            for i in range(3)
+        ]
+        hosts = self.create_resource('hosts', list_meta_dir, {'ip': []})
+        for service in services:
+            xs.connect(node, service)
+            xs.connect(service, hosts)
+
+        with mock.patch.object(
+                xs.db, 'pipeline', wraps=xs.db.pipeline) as pipeline, \
+                mock.patch.object(
+                    xs.db, 'save_list', wraps=xs.db.save_list) as save_list:
+            node.update({'ip': '10.0.0.2'})
+
+        self.assertEqual(pipeline.call_count, 1)
+        resource_saves = [
+            c for c in save_list.call_args_list
+            if c[1]['collection'] == xs.db.COLLECTIONS.resource]
+        self.assertEqual(len(resource_saves), 1)
+        saved = [uid for uid, _ in resource_saves[0][0][0]]
+        self.assertItemsEqual(
+            saved, ['node', 'hosts'] + [s.name for s in services])
+
+        for service in services:
+            self.assertEqual(service.args['ip'], '10.0.0.2')
+        self.assertItemsEqual(
+            [v['value'] for v in hosts.args['ip'].value],
+            ['10.0.0.2'] * 3
+        )
+
 
 class TestListInput(base.BaseResourceTest):
     def test_list_input_single(self):
@@ -0,0 +1,44 @@
+import mock
+from pytest import fixture
+
+from solar.core.handlers import ssh_pool
+
+
+@fixture
+def connect(request):
+    patcher = mock.patch.object(ssh_pool.network, 'connect')
+    request.addfinalizer(patcher.stop)
+    connect = patcher.start()
+    connect.side_effect = lambda *args, **kwargs: mock.Mock()
+    return connect
+
+
+def test_connection_reused_per_key(connect):
+    pool = ssh_pool.SSHPool()
+
+    client = pool.get('vagrant', '10.0.0.3', '/key')
+    assert pool.get('vagrant', '10.0.0.3', '/key') is client
+    assert pool.get('vagrant', '10.0.0.3', '/other_key') is not client
+    assert connect.call_count == 2
+
+
+def test_closed_connection_replaced(connect):
+    pool = ssh_pool.SSHPool()
+
+    client = pool.get('vagrant', '10.0.0.3', '/key')
+    client.get_transport.return_value.is_active.return_value = False
+
+    assert pool.get('vagrant', '10.0.0.3', '/key') is not client
+    assert client.close.called
+
+
+def test_idle_connections_evicted(connect):
+    pool = ssh_pool.SSHPool(idle_timeout=10)
+
+    with mock.patch.object(ssh_pool.time, 'time', return_value=100):
+        client = pool.get('vagrant', '10.0.0.3', '/key')
+    with mock.patch.object(ssh_pool.time, 'time', return_value=111):
+        pool.evict_idle()
+
+    assert client.close.called
+    assert pool.clients == {}
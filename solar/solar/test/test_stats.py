@@ -0,0 +1,47 @@
+import networkx as nx
+from pytest import fixture
+
+from solar.orchestration import stats
+
+
+@fixture
+def dg():
+    dg = nx.DiGraph()
+    dg.add_node('t1', target='1', enqueued_at=0, started_at=1, finished_at=4)
+    dg.add_node('t2', target='2', enqueued_at=0, started_at=0, finished_at=1)
+    dg.add_node('t3', target='1', enqueued_at=4.5, started_at=5,
+                finished_at=6)
+    dg.add_node('t4', target='2', enqueued_at=2, started_at=2, finished_at=9)
+    dg.add_edge('t1', 't3')
+    dg.add_edge('t2', 't3')
+    dg.add_edge('t2', 't4')
+    return dg
+
+
+def test_durations(dg):
+    assert stats.durations(dg.node['t1']) == {'wait': 1, 'run': 3}
+    assert stats.durations({'enqueued_at': 1}) == {'wait': None, 'run': None}
+
+
+def test_critical_path(dg):
+    assert stats.critical_path(dg) == (['t2', 't4'], 8)
+
+
+def test_target_utilisation(dg):
+    assert stats.wall_time(dg) == 9
+    assert stats.target_utilisation(dg) == {
+        '1': (4, 4 / 9.0),
+        '2': (8, 8 / 9.0),
+    }
+
+
+def test_concurrent_tasks_utilise_target_once(dg):
+    dg.add_node('t5', target='1', started_at=1.5, finished_at=4.5)
+    dg.add_node('t6', target='1', started_at=2, finished_at=3)
+    assert stats.target_utilisation(dg)['1'] == (4.5, 4.5 / 9.0)
+
+
+def test_tick_latencies(dg):
+    assert sorted(stats.tick_latencies(dg)) == [0.5, 1]
+    assert stats.histogram([0.5, 1, 100], buckets=(0.5, 1, 10)) == [
+        (0.5, 1), (1, 1), (10, 0)]
@@ -1,7 +1,10 @@
 
-from pytest import fixture
+from mock import patch
+from pytest import fixture, raises
 
+from solar.interfaces.db import redis_db
 from solar.system_log import data
+from solar.system_log import operations
 
 @fixture
 def host_diff():
@@ -39,3 +42,65 @@ def single_change():
 
 def test_single_details_for_change(single_change):
     assert data.details(single_change) == ['-+ riak_port_http: 18098 >> 88888']
+
+
+def test_commited_data_per_key():
+    cd = data.CD()
+    cd.clean()
+    cd['res.1'] = {'ip': '10.0.0.2'}
+    cd.update_many([('res.2', {}), ('res.3', {'port': 22})])
+    del cd['res.2']
+
+    cd = data.CD()
+    assert cd.get('res.1') == {'ip': '10.0.0.2'}
+    assert cd.get('res.2', 'missing') == 'missing'
+    assert sorted(cd) == ['res.1', 'res.3']
+    assert len(cd) == 2
+
+
+def test_commited_data_upgraded_once():
+    data._upgraded.discard('commited_data')
+    data.db.save('commited_data', {'res.1': {'ip': '10.0.0.2'}},
+                 collection=data.db.COLLECTIONS.state_data)
+
+    assert data.CD().get('res.1') == {'ip': '10.0.0.2'}
+    with patch.object(redis_db.Hash, 'upgrade') as upgrade:
+        data.CD()
+    assert not upgrade.called
+
+
+def test_events_applied_in_order():
+    sl = data.SL()
+    for res in ('n1', 'n2', 'n3'):
+        sl.append(data.LogItem(
+            res, res, '{}.run'.format(res),
+            [['add', '', [['ip', '10.0.0.1']]]]))
+
+    assert operations.add_event('commit', 'n2.run')
+    # queue is already being drained
+    assert not operations.add_event('error', 'n3.run')
+    assert not operations.add_event('commit', 'n1.run')
+
+    operations.process_events(count=2)
+
+    assert [i.log_action for i in data.CL().reverse()] == ['n2.run', 'n1.run']
+    assert sl.get('n3.run').state == data.STATES.error
+    assert data.CD()['n1'] == {'ip': '10.0.0.1'}
+    assert operations.add_event('commit', 'n3.run')
+
+
+def test_events_kept_if_apply_failed():
+    sl = data.SL()
+    sl.append(data.LogItem(
+        'n1', 'n1', 'n1.run', [['add', '', [['ip', '10.0.0.1']]]]))
+    assert operations.add_event('commit', 'n1.run')
+
+    with patch.object(operations, 'apply_events', side_effect=Exception):
+        with raises(Exception):
+            operations.process_events()
+
+    # flag is released, so the next event starts a new drain
+    assert operations.add_event('commit', 'n1.run')
+    operations.process_events()
+
+    assert [i.log_action for i in data.CL().reverse()] == ['n1.run']
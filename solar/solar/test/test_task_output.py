@@ -0,0 +1,45 @@
+import fakeredis
+from pytest import fixture
+from mock import patch
+
+from solar.core import process
+from solar.orchestration import graph
+from solar.orchestration import output
+
+
+@fixture(autouse=True)
+def redis_client(request):
+    patcher = patch.object(graph, 'r', fakeredis.FakeStrictRedis())
+    client = patcher.start()
+    request.addfinalizer(patcher.stop)
+    request.addfinalizer(client.flushdb)
+    return client
+
+
+def test_output_of_process_captured():
+    with output.capture('plan:task') as out:
+        process.run(['sh', '-c', 'echo first; echo second'],
+                    on_output=process.output_callback())
+
+    summary = out.summary()
+    assert summary['size'] == len('first\nsecond\n')
+    assert summary['tail'] == 'first\nsecond\n'
+    assert output.tail('plan:task', 1) == ['second']
+
+
+def test_output_rotated():
+    with patch.object(output, 'MAX_CHUNKS', 2):
+        with output.capture('plan:task', 'node1') as out:
+            on_output = process.output_callback('node1')
+            on_output('stdout', 'a')
+            data, position = output.read('plan:task')
+            for chunk in 'bcd':
+                on_output('stdout', chunk)
+
+    assert data == 'a'
+    assert output.read('plan:task') == ('cd', 4)
+    # continues after the last read chunk, rotated chunks are skipped
+    assert output.read('plan:task', position) == ('cd', 4)
+    assert output.read('plan:task', 3) == ('d', 4)
+    # callback is unregistered after capture
+    assert process.output_callback('node1') is None
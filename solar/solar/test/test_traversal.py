@@ -3,6 +3,7 @@
 import networkx as nx
 from pytest import fixture
 
+from solar.orchestration.traversal import remaining_predecessors
 from solar.orchestration.traversal import traverse
 
 @fixture
@@ -54,3 +55,12 @@ def test_node_will_be_walked_if_parent_is_noop(dg):
     dg.node['t1']['status'] = 'NOOP'
 
     assert set(traverse(dg)) == {'t2'}
+
+
+def test_remaining_predecessors(dg):
+    dg.add_path(['t1', 't3', 't4', 't5'])
+    dg.add_path(['t2', 't3'])
+    dg.node['t1']['status'] = 'SUCCESS'
+
+    assert remaining_predecessors(dg) == {
+        't1': 0, 't2': 0, 't3': 1, 't4': 1, 't5': 1}
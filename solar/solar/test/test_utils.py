@@ -0,0 +1,46 @@
+import os
+
+import mock
+from pytest import fixture
+
+from solar import utils
+
+
+@fixture
+def yaml_file(tmpdir):
+    path = tmpdir.join('meta.yaml')
+    path.write('id: sample\n')
+    return path
+
+
+def test_file_cache_invalidated_by_mtime(yaml_file):
+    loader = mock.Mock(side_effect=utils._yaml_load)
+    cache = utils.FileCache(loader)
+
+    assert cache.get(str(yaml_file)) == {'id': 'sample'}
+    assert cache.get(str(yaml_file)) == {'id': 'sample'}
+    assert loader.call_count == 1
+
+    yaml_file.write('id: changed\n')
+    mtime = os.path.getmtime(str(yaml_file))
+    os.utime(str(yaml_file), (mtime + 1, mtime + 1))
+
+    assert cache.get(str(yaml_file)) == {'id': 'changed'}
+    assert loader.call_count == 2
+
+
+def test_file_cache_size_bound(tmpdir):
+    cache = utils.FileCache(lambda path: path, size=2)
+    paths = []
+    for name in ('a', 'b', 'c'):
+        path = tmpdir.join(name)
+        path.write('')
+        paths.append(str(path))
+        cache.get(str(path))
+
+    assert [key[0] for key in cache.entries] == paths[1:]
+
+
+def test_yaml_load_returns_copy(yaml_file):
+    utils.yaml_load(str(yaml_file))['id'] = 'modified'
+    assert utils.yaml_load(str(yaml_file)) == {'id': 'sample'}
@@ -4,7 +4,10 @@ import glob
 import yaml
 import logging
 import os
+import threading
 
+from collections import OrderedDict
+from copy import deepcopy
 from uuid import uuid4
 
 from jinja2 import Template
@@ -18,11 +21,60 @@ def create_dir(dir_path):
         os.makedirs(dir_path)
 
 
-def yaml_load(file_path):
+class FileCache(object):
+    """Process wide cache of values produced from files.
+
+    Entries are keyed by path and mtime of the file, so a changed file is
+    loaded again. At most `size` least recently used entries are kept.
+    """
+
+    def __init__(self, loader, size=256):
+        self.loader = loader
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        key = (path, os.path.getmtime(path))
+
+        with self.lock:
+            if key in self.entries:
+                value = self.entries.pop(key)
+                self.entries[key] = value
+                return value
+
+        value = self.loader(path)
+
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def _yaml_load(file_path):
     with io.open(file_path) as f:
-        result = yaml.load(f)
+        return yaml.load(f)
 
-    return result
+
+def _template_load(file_path):
+    with io.open(file_path) as f:
+        return Template(f.read())
+
+
+_yaml_cache = FileCache(_yaml_load)
+_template_cache = FileCache(_template_load)
+
+
+def yaml_load(file_path):
+    # cached value is shared, callers are free to modify their copy
+    return deepcopy(_yaml_cache.get(file_path))
 
 
 def yaml_dump(yaml_data):
@@ -55,11 +107,13 @@ def generate_uuid():
     return str(uuid4())
 
 
-def render_template(template_path, params):
-    with io.open(template_path) as f:
-        temp = Template(f.read())
+def load_template(template_path):
+    """Compiled jinja2 template, cached until the file is changed."""
+    return _template_cache.get(template_path)
 
-    return temp.render(**params)
+
+def render_template(template_path, params):
+    return load_template(template_path).render(**params)
 
 
 def ext_encoder(fpath):